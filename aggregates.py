@@ -0,0 +1,140 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+import storage
+from saldo_index import to_cents
+
+# --- PERIODETOTALEN ---
+# Omzet per BTW-tarief en ontvangsten per betaalwijze, in centen, per dag, maand en kwartaal,
+# in een SQLite-database naast de historiek. Bij elke opgeslagen dag worden enkel die dagrij,
+# zijn maandrij en zijn kwartaalrij herschreven; jaartotalen volgen uit de (hoogstens vier)
+# kwartalen. Opbouw, marker en herbouw bij een afwijkende historiek zoals de saldo-index.
+
+COLUMNS = ["Omzet_0", "Omzet_6", "Omzet_12", "Omzet_21", "Totaal_Omzet",
+           "Geld_Bancontact", "Geld_Cash", "Geld_Payconiq", "Geld_Overschrijving", "Geld_Bonnen",
+           "Geld_Afstorting"]
+# Laatste positie van een maand-/kwartaalrij: aantal dagen met omzet
+OPEN_DAYS = "Open_Dagen"
+LEVELS = ["dag", "maand", "kwartaal", "jaar"]
+
+VERSION = 1
+_COLUMNS_SQL = ", ".join(f'"{col}"' for col in COLUMNS)
+_SUMS_SQL = ", ".join(f'SUM("{col}")' for col in COLUMNS)
+_OPEN_SQL = 'CAST("Totaal_Omzet" > 0 AS INTEGER)'
+# Per niveau: (tabel, sleutelkolom, uitdrukking voor de open dagen)
+_LEVEL_SQL = {"dag": ("dagen", "datum", _OPEN_SQL), "maand": ("maanden", "maand", "open_dagen"),
+              "kwartaal": ("kwartalen", "kwartaal", "open_dagen")}
+
+def _quarter(month):
+    return f"{month[:4]}-Q{(int(month[5:7]) - 1) // 3 + 1}"
+
+def _quarter_months(quarter):
+    first = (int(quarter[-1]) - 1) * 3 + 1
+    return [f"{quarter[:4]}-{m:02d}" for m in range(first, first + 3)]
+
+def _day_values(record):
+    return [to_cents(record.get(col, 0.0)) for col in COLUMNS]
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (sleutel TEXT PRIMARY KEY, waarde TEXT)")
+    return conn
+
+def _create_tables(conn):
+    # Bij een herbouw opnieuw aangemaakt, zodat een gewijzigde kolomindeling meteen volgt
+    amounts = ", ".join(f'"{col}" INTEGER NOT NULL' for col in COLUMNS)
+    for table in ("dagen", "maanden", "kwartalen"):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute(f"CREATE TABLE dagen (datum TEXT PRIMARY KEY, maand TEXT NOT NULL, {amounts}) WITHOUT ROWID")
+    conn.execute("CREATE INDEX dagen_maand ON dagen (maand)")
+    conn.execute(f"CREATE TABLE maanden (maand TEXT PRIMARY KEY, {amounts}, open_dagen INTEGER NOT NULL) WITHOUT ROWID")
+    conn.execute(f"CREATE TABLE kwartalen (kwartaal TEXT PRIMARY KEY, {amounts}, open_dagen INTEGER NOT NULL) WITHOUT ROWID")
+
+def _stamp(marker):
+    return f"{VERSION}:{','.join(COLUMNS)}:{marker or ''}"
+
+def _in_sync(conn, marker):
+    # Zonder marker (None) volstaat een opgebouwde index van deze versie en kolomindeling
+    row = conn.execute("SELECT waarde FROM meta WHERE sleutel = 'historiek'").fetchone()
+    if row is None or not row[0].startswith(_stamp(None)):
+        return False
+    return marker is None or row[0] == _stamp(marker)
+
+def _set_marker(conn, marker):
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('historiek', ?)", (_stamp(marker),))
+
+def _put_days(conn, rows):
+    # rows: (datum, [centen per kolom]); daarna enkel de geraakte maanden en kwartalen herrekenen
+    placeholders = ", ".join("?" * len(COLUMNS))
+    conn.executemany(f"INSERT OR REPLACE INTO dagen (datum, maand, {_COLUMNS_SQL}) VALUES (?, ?, {placeholders})",
+                     [(datum, datum[:7], *values) for datum, values in rows])
+    months = sorted({datum[:7] for datum, _ in rows})
+    conn.executemany(f"INSERT OR REPLACE INTO maanden SELECT maand, {_SUMS_SQL}, SUM({_OPEN_SQL}) "
+                     "FROM dagen WHERE maand = ? GROUP BY maand", [(m,) for m in months])
+    quarters = sorted({_quarter(m) for m in months})
+    conn.executemany(f"INSERT OR REPLACE INTO kwartalen SELECT ?, {_SUMS_SQL}, SUM(open_dagen) "
+                     "FROM maanden WHERE maand IN (?, ?, ?) GROUP BY 1",
+                     [(q, *_quarter_months(q)) for q in quarters])
+
+def rebuild(path, df_history, marker=None):
+    rows = []
+    if df_history is not None and not df_history.empty:
+        df = df_history.drop_duplicates(subset="Datum", keep="first")
+        cents = [(pd.to_numeric(df[col], errors="coerce").fillna(0.0) * 100).round().astype("int64").tolist()
+                 for col in COLUMNS]
+        rows = list(zip(df["Datum"].astype(str), map(list, zip(*cents))))
+    with storage.file_lock(path), closing(_connect(path)) as conn, conn:
+        _create_tables(conn)
+        _put_days(conn, rows)
+        _set_marker(conn, marker)
+
+def _ensure(path, history_loader, marker):
+    if os.path.exists(path):
+        with closing(_connect(path)) as conn:
+            if _in_sync(conn, marker):
+                return
+    with storage.file_lock(path):
+        if os.path.exists(path):
+            with closing(_connect(path)) as conn:
+                if _in_sync(conn, marker):
+                    return
+        # Ontbrekend, met een oudere kolomindeling of achter op de historiek: volledig opnieuw opbouwen
+        rebuild(path, history_loader() if history_loader else None, marker)
+
+def update_days(path, records, expected=None, marker=None):
+    # expected/marker: toestand van de historiek vóór en na deze schrijfactie, zoals bij de saldo-index
+    with storage.file_lock(path):
+        if not os.path.exists(path):
+            # Wordt bij de eerste opvraging volledig opgebouwd, inclusief deze dagen
+            return
+        with closing(_connect(path)) as conn, conn:
+            if not _in_sync(conn, expected):
+                return
+            _put_days(conn, [(str(record["Datum"]), _day_values(record)) for record in records])
+            _set_marker(conn, marker)
+
+def update_day(path, record, expected=None, marker=None):
+    update_days(path, [record], expected, marker)
+
+def totals(path, level="maand", start=None, end=None, history_loader=None, marker=None):
+    # start/end in dezelfde notatie als het niveau: "2025-01-31", "2025-01", "2025-Q1" of "2025"
+    if level not in LEVELS:
+        raise ValueError(f"Onbekend niveau: {level}")
+    _ensure(path, history_loader, marker)
+    if level == "jaar":
+        table, key, open_days = "kwartalen", "substr(kwartaal, 1, 4)", "open_dagen"
+        query = f"SELECT {key} AS k, {_SUMS_SQL}, SUM({open_days}) FROM {table} GROUP BY k"
+    else:
+        table, key, open_days = _LEVEL_SQL[level]
+        query = f"SELECT {key} AS k, {_COLUMNS_SQL}, {open_days} FROM {table}"
+    query = f"SELECT * FROM ({query}) WHERE (? IS NULL OR k >= ?) AND (? IS NULL OR k <= ?) ORDER BY k"
+    with closing(_connect(path)) as conn:
+        rows = conn.execute(query, (start, start, end, end)).fetchall()
+    df = pd.DataFrame([row[1:] for row in rows], index=pd.Index([row[0] for row in rows], name=level.capitalize()),
+                      columns=COLUMNS + [OPEN_DAYS])
+    df[COLUMNS] = df[COLUMNS] / 100
+    return df
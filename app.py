@@ -1,14 +1,23 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta, date
+from datetime import timedelta, date
 import time
-import os
 import locale
 import calendar
-import json
-import random
-from jinja2 import Environment, FileSystemLoader
 import streamlit_shadcn_ui as ui
+import storage
+import saldo_index
+import aggregates
+import cache
+import instrumentation
+import bulk_import
+import export_cache
+import export_jobs
+from kassa_core import (
+    SALDO_INDEX_FILE, AGGREGATES_FILE, KASSA_NAME_PATTERN, kassa_file, list_kassas, create_kassa,
+    history_backend, load_database, get_data_by_date,
+    history_marker, migrate_history, calculate_current_saldo, save_transaction, get_period_totals, category_schema, summarize_input,
+)
 
 # Probeer NL instellingen
 try:
@@ -16,329 +25,16 @@ try:
 except:
     pass
 
-# --- CONFIGURATIE ---
-DATA_FILE = "kassa_historiek.csv"
-SETTINGS_FILE = "kassa_settings.csv"
-EXPORT_CONFIG_FILE = "export_config.csv"
-CONFIG_FILE = "kassa_config.json"
 ADMIN_PASSWORD = "Yuki2025!"
 
 st.set_page_config(page_title="Dagontvangsten Pro", page_icon="💶", layout="centered")
 
-# --- FUNCTIES ---
-
-def generate_valid_belgian_iban():
-    protocol = "999"
-    random_part = "".join([str(random.randint(0, 9)) for _ in range(7)])
-    base_num = int(protocol + random_part)
-    remainder = base_num % 97
-    check_digits = 97 if remainder == 0 else remainder
-    bban = f"{protocol}{random_part}{check_digits:02d}"
-    country_code_num = "111400"
-    iban_check_base = int(bban + country_code_num)
-    iban_remainder = iban_check_base % 97
-    iban_check = 98 - iban_remainder
-    return f"BE{iban_check:02d}{bban}"
-
-def load_config():
-    default_config = {
-        "start_saldo": 0.0,
-        "iban": "",
-        "coda_seq": 0,
-        "laatste_update": str(datetime.now().date())
-    }
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r") as f:
-            data = json.load(f)
-            for key, value in default_config.items():
-                if key not in data:
-                    data[key] = value
-            return data
-    return default_config
-
-def save_config(config_data):
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config_data, f)
-
-def get_default_settings():
-    return [
-        {"Code": "Omzet_21",   "Label": "Omzet 21%",       "Rekening": "700021", "ExportDesc": "Omzet 21% (&notitie&) GL-700021", "BtwCode": "V21", "Type": "Credit"},
-        {"Code": "Omzet_12",   "Label": "Omzet 12%",       "Rekening": "700012", "ExportDesc": "Omzet 12% (&notitie&) GL-700012", "BtwCode": "V12", "Type": "Credit"},
-        {"Code": "Omzet_6",    "Label": "Omzet 6%",        "Rekening": "700006", "ExportDesc": "Omzet 6% (&notitie&) GL-700006",  "BtwCode": "V6",  "Type": "Credit"},
-        {"Code": "Omzet_0",    "Label": "Omzet 0%",        "Rekening": "700000", "ExportDesc": "Omzet 0% (&notitie&) GL-700000",  "BtwCode": "V0",  "Type": "Credit"},
-        {"Code": "Cash",       "Label": "Kas (Cash)",      "Rekening": "570000", "ExportDesc": "Ontvangst Cash GL-570000",        "BtwCode": "",    "Type": "Debet"},
-        {"Code": "Bancontact", "Label": "Bancontact",      "Rekening": "580000", "ExportDesc": "Bancontact &datum& GL-580000",     "BtwCode": "",    "Type": "Debet"},
-        {"Code": "Payconiq",   "Label": "Payconiq",        "Rekening": "580000", "ExportDesc": "Payconiq &datum& GL-580000",       "BtwCode": "",    "Type": "Debet"},
-        {"Code": "Oversch",    "Label": "Overschrijving",  "Rekening": "580000", "ExportDesc": "Overschrijving &datum& GL-580000","BtwCode": "",    "Type": "Debet"},
-        {"Code": "Bonnen",     "Label": "Cadeaubonnen",    "Rekening": "440000", "ExportDesc": "Cadeaubon &datum& GL-440000",      "BtwCode": "",    "Type": "Debet"},
-        {"Code": "Afstorting", "Label": "Afstorting Bank", "Rekening": "550000", "ExportDesc": "Afstorting &datum& GL-550000",     "BtwCode": "",    "Type": "Credit"},
-    ]
-
-def load_settings():
-    if os.path.exists(SETTINGS_FILE):
-        df = pd.read_csv(SETTINGS_FILE, dtype={"Rekening": str, "BtwCode": str})
-        defaults = pd.DataFrame(get_default_settings())
-        for code in defaults["Code"]:
-            if code not in df["Code"].values:
-                row = defaults[defaults["Code"] == code].iloc[0]
-                df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-        return df
-    else:
-        df = pd.DataFrame(get_default_settings())
-        df["Rekening"] = df["Rekening"].astype(str)
-        df.to_csv(SETTINGS_FILE, index=False)
-        return df
-
-def save_settings(df_settings):
-    df_settings.to_csv(SETTINGS_FILE, index=False)
-
-def get_yuki_mapping():
-    df = load_settings()
-    mapping = {}
-    for _, row in df.iterrows():
-        mapping[row['Code']] = {
-            'Rekening': row['Rekening'],
-            'Label': row['Label'],
-            'Template': row.get('ExportDesc', row['Label'])
-        }
-    return mapping
-
-def get_default_export_config():
-    return pd.DataFrame([
-        {"Kolom": "Grootboekrekening kas", "Bron": "Vast", "Waarde": "570000"},
-        {"Kolom": "Kas omschrijving",      "Bron": "Vast", "Waarde": "Dagontvangsten"},
-        {"Kolom": "Transactie code",       "Bron": "Vast", "Waarde": ""},
-        {"Kolom": "Tegenrekening",         "Bron": "Veld", "Waarde": "Grootboekrekening"},
-        {"Kolom": "Naam tegenrekening",    "Bron": "Veld", "Waarde": "Label"},
-        {"Kolom": "Datum transactie",      "Bron": "Veld", "Waarde": "Datum"},
-        {"Kolom": "Omschrijving",          "Bron": "Veld", "Waarde": "Omschrijving"},
-        {"Kolom": "Bedrag",                "Bron": "Veld", "Waarde": "Bedrag"},
-        {"Kolom": "Saldo kas",             "Bron": "Vast", "Waarde": ""},
-        {"Kolom": "Projectcode",           "Bron": "Vast", "Waarde": ""},
-        {"Kolom": "Projectnaam",           "Bron": "Vast", "Waarde": ""},
-    ])
-
-def load_export_config():
-    if os.path.exists(EXPORT_CONFIG_FILE):
-        return pd.read_csv(EXPORT_CONFIG_FILE)
-    else:
-        df = get_default_export_config()
-        df.to_csv(EXPORT_CONFIG_FILE, index=False)
-        return df
-
-def save_export_config(df):
-    df.to_csv(EXPORT_CONFIG_FILE, index=False)
-
-def load_database():
-    if os.path.exists(DATA_FILE):
-        df = pd.read_csv(DATA_FILE)
-        df = df.fillna("")
-        for col in ["Geld_Overschrijving", "Geld_Afstorting"]:
-            if col not in df.columns:
-                df[col] = 0.0
-        return df
-    else:
-        cols = ["Datum", "Omschrijving", "Totaal_Omzet", "Totaal_Geld", "Verschil",
-                "Omzet_0", "Omzet_6", "Omzet_12", "Omzet_21",
-                "Geld_Bancontact", "Geld_Cash", "Geld_Payconiq", "Geld_Overschrijving",
-                "Geld_Bonnen", "Geld_Afstorting", "Timestamp"]
-        return pd.DataFrame(columns=cols)
-
-def get_data_by_date(datum_obj):
-    df = load_database()
-    match = df[df['Datum'] == str(datum_obj)]
-    return match.iloc[0] if not match.empty else None
-
-def calculate_current_saldo(target_date):
-    config = load_config()
-    start = float(config.get("start_saldo", 0.0))
-    df = load_database()
-    if df.empty:
-        return start
-    df['DatumDT'] = pd.to_datetime(df['Datum'])
-    hist = df[df['DatumDT'] < pd.to_datetime(target_date)]
-    return start + hist['Geld_Cash'].sum() - hist['Geld_Afstorting'].sum()
-
-def save_transaction(datum, omschrijving, df_input, totaal_omzet, totaal_geld, verschil):
-    df_db = load_database()
-    datum_str = str(datum)
-    df_db = df_db[df_db['Datum'] != datum_str]
-
-    if df_input is None:
-        df_input = pd.DataFrame(columns=['Label', 'Bedrag'])
-    if not omschrijving or str(omschrijving).strip() == "":
-        omschrijving = f"Dagontvangsten {pd.to_datetime(datum).strftime('%d-%m-%Y')}"
-
-    new_row = {
-        "Datum": datum_str, "Omschrijving": omschrijving, "Totaal_Omzet": totaal_omzet,
-        "Totaal_Geld": totaal_geld, "Verschil": verschil,
-        "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "Omzet_0": 0.0, "Omzet_6": 0.0, "Omzet_12": 0.0, "Omzet_21": 0.0,
-        "Geld_Bancontact": 0.0, "Geld_Cash": 0.0, "Geld_Payconiq": 0.0,
-        "Geld_Overschrijving": 0.0, "Geld_Bonnen": 0.0, "Geld_Afstorting": 0.0
-    }
-    for _, row in df_input.iterrows():
-        label = row['Label']
-        bedrag = float(row['Bedrag'])
-        if bedrag <= 0:
-            continue
-        if "0%" in label: new_row["Omzet_0"] = bedrag
-        elif "6%" in label: new_row["Omzet_6"] = bedrag
-        elif "12%" in label: new_row["Omzet_12"] = bedrag
-        elif "21%" in label: new_row["Omzet_21"] = bedrag
-        elif "Bancontact" in label: new_row["Geld_Bancontact"] = bedrag
-        elif "Cash" in label: new_row["Geld_Cash"] = bedrag
-        elif "Payconiq" in label: new_row["Geld_Payconiq"] = bedrag
-        elif "Overschrijving" in label: new_row["Geld_Overschrijving"] = bedrag
-        elif "Bonnen" in label: new_row["Geld_Bonnen"] = bedrag
-        elif "Afstorting" in label: new_row["Geld_Afstorting"] = bedrag
-
-    new_entry_df = pd.DataFrame([new_row])
-    df_db = pd.concat([df_db, new_entry_df], ignore_index=True)
-    df_db = df_db.sort_values(by="Datum", ascending=False)
-    if 'DatumDT' in df_db.columns:
-        del df_db['DatumDT']
-    df_db.to_csv(DATA_FILE, index=False)
-
-def generate_csv_export(start_date, end_date):
-    df_data = load_database()
-    export_config = load_export_config()
-    MAPPING = get_yuki_mapping()
-    mask = (df_data['Datum'] >= str(start_date)) & (df_data['Datum'] <= str(end_date))
-    selection = df_data.loc[mask].sort_values(by="Datum")
-    if selection.empty:
-        return None
-
-    export_rows = []
-    for _, row in selection.iterrows():
-        if row['Totaal_Omzet'] == 0 and row['Totaal_Geld'] == 0:
-            continue
-        datum_fmt = pd.to_datetime(row['Datum']).strftime('%d-%m-%Y')
-        desc_user = row['Omschrijving']
-
-        transactions = []
-        def add_trx(code_key, bedrag, btw):
-            if bedrag <= 0:
-                return
-            info = MAPPING.get(code_key, {})
-            final_desc = info.get('Template', '').replace("&datum&", datum_fmt).replace("&notitie&", desc_user)
-            if not final_desc:
-                final_desc = info.get('Label', code_key)
-            transactions.append({"Rek": info.get('Rekening', ''), "Bedrag": -bedrag if code_key == "Afstorting" else bedrag, "Btw": btw, "Desc": final_desc, "Label": info.get('Label', '')})
-
-        for code, col, btw in [("Omzet_21", "Omzet_21", "V21"), ("Omzet_12", "Omzet_12", "V12"), ("Omzet_6", "Omzet_6", "V6"), ("Omzet_0", "Omzet_0", "V0")]:
-            if row[col] > 0:
-                add_trx(code, row[col], btw)
-        for code, col in [("Bancontact", "Geld_Bancontact"), ("Payconiq", "Geld_Payconiq"), ("Oversch", "Geld_Overschrijving"), ("Bonnen", "Geld_Bonnen"), ("Cash", "Geld_Cash")]:
-            if row[col] > 0:
-                add_trx(code, row[col], "")
-        if row['Geld_Afstorting'] > 0:
-            add_trx("Afstorting", row['Geld_Afstorting'], "")
-
-        for t in transactions:
-            export_row = {}
-            for _, cfg in export_config.iterrows():
-                col_name = cfg['Kolom']
-                source = cfg['Bron']
-                val_key = cfg['Waarde']
-                val = ""
-                if source == "Vast":
-                    val = val_key
-                elif source == "Veld":
-                    if val_key == "Datum":
-                        val = datum_fmt
-                    elif val_key == "Omschrijving":
-                        val = t['Desc']
-                    elif val_key == "Label":
-                        val = t['Label']
-                    elif val_key == "Bedrag":
-                        val = f"{t['Bedrag']:.2f}".replace('.', ',')
-                    elif val_key == "Grootboekrekening":
-                        val = t['Rek']
-                    elif val_key == "BtwCode":
-                        val = t['Btw']
-                export_row[col_name] = val
-            export_rows.append(export_row)
-    return pd.DataFrame(export_rows)
-
-def generate_xml_export(start_date, end_date):
-    df_data = load_database()
-    config = load_config()
-    mask = (df_data['Datum'] >= str(start_date)) & (df_data['Datum'] <= str(end_date))
-    selection = df_data.loc[mask].sort_values(by="Datum")
-    if selection.empty:
-        return None, None
-
-    my_iban = config.get("iban", "").replace(" ", "")
-    coda_seq = int(config.get("coda_seq", 0))
-    MAPPING = get_yuki_mapping()
-
-    statements_data = []
-    current_balance_val = calculate_current_saldo(start_date)
-
-    for _, row in selection.iterrows():
-        if row['Totaal_Omzet'] == 0 and row['Totaal_Geld'] == 0:
-            continue
-
-        coda_seq += 1
-        datum_iso = row['Datum']
-
-        transactions = []
-
-        if float(row['Totaal_Omzet']) > 0:
-            transactions.append({
-                "amt": float(row['Totaal_Omzet']), "sign": "CRDT",
-                "desc": f"Dagontvangsten {row['Omschrijving']}",
-                "dom": "PMNT", "fam": "RCDT", "sub": "ESCT"
-            })
-
-        for col, code_key in [('Geld_Bancontact', 'Bancontact'), ('Geld_Payconiq', 'Payconiq'),
-                              ('Geld_Overschrijving', 'Oversch'), ('Geld_Bonnen', 'Bonnen'),
-                              ('Geld_Afstorting', 'Afstorting')]:
-            val = float(row[col])
-            if val > 0:
-                info = MAPPING.get(code_key, {})
-                desc_text = info.get('Template', '').replace("&datum&", datum_iso).replace("&notitie&", row['Omschrijving'])
-                if not desc_text:
-                    desc_text = info.get('Label', code_key)
-                transactions.append({
-                    "amt": val, "sign": "DBIT",
-                    "desc": desc_text,
-                    "dom": "PMNT", "fam": "ICDT", "sub": "ESCT"
-                })
-
-        daily_movement = sum(t["amt"] if t["sign"] == "CRDT" else -t["amt"] for t in transactions)
-        closing_balance_val = current_balance_val + daily_movement
-
-        statements_data.append({
-            "id": f"KASSA-{coda_seq:04d}",
-            "seq_nb": coda_seq,
-            "date": datum_iso,
-            "opening_balance": current_balance_val,
-            "closing_balance": closing_balance_val,
-            "entries": transactions
-        })
-
-        current_balance_val = closing_balance_val
-
-    config["coda_seq"] = coda_seq
-    save_config(config)
-
-    try:
-        env = Environment(loader=FileSystemLoader('.'))
-        template = env.get_template('camt053_template.xml')
-        context = {
-            "msg_id": f"KASSA-{datetime.now().strftime('%Y%m%d%H%M%S')}",
-            "creation_datetime": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
-            "iban": my_iban,
-            "statements": statements_data
-        }
-        xml_string = template.render(context)
-        filename = f"CAMT053_{my_iban}_{datetime.now().strftime('%Y%m%d')}.xml"
-        return xml_string, filename
-    except Exception as e:
-        st.error(f"Template fout: {e}")
-        return None, None
+# --- INSTRUMENTATIE ---
+# Elke rerun is een run; een run die door st.rerun() werd afgebroken sluiten we hier alsnog af
+vorige_run = st.session_state.get("diag_run")
+if vorige_run is not None:
+    instrumentation.end_run(vorige_run, interrupted=True)
+st.session_state.diag_run = instrumentation.begin_run("rerun", profile=st.session_state.get("diag_profiel", False))
 
 # --- STATE ---
 if 'reset_count' not in st.session_state:
@@ -353,12 +49,19 @@ with st.sidebar:
     ui.badge("Dagontvangsten Pro", color="blue", variant="default", class_name="text-xl font-bold mb-4")
     st.caption("Beter dan Scrada — moderner, flexibeler")
 
+    kassas = list_kassas()
+    if kassas:
+        gekozen_kassa = st.selectbox("Kassa", ["Standaard"] + kassas, key="kassa_keuze")
+        kassa = None if gekozen_kassa == "Standaard" else gekozen_kassa
+    else:
+        kassa = None
+
     pwd = st.text_input("Admin wachtwoord", type="password", placeholder="Voor instellingen & export")
     is_admin = (pwd == ADMIN_PASSWORD)
 
     if is_admin:
         ui.badge("Admin ingelogd", color="green", variant="outline")
-        tabs_options = ["Invoer", "Export (Yuki)", "Instellingen", "Export Config", "Kassaldo Beheer"]
+        tabs_options = ["Invoer", "Export (Yuki)", "Instellingen", "Export Config", "Dashboard", "Kassaldo Beheer", "Import", "Diagnostics"]
         app_mode = ui.tabs(tabs_options, default_index=0, key="main_nav")
     else:
         st.info("Alleen invoer mogelijk zonder wachtwoord")
@@ -367,9 +70,10 @@ with st.sidebar:
 # ==========================================
 # HOOFDSCHERM
 # ==========================================
+st.session_state.diag_run.label = f"{app_mode} ({kassa or 'standaard'})"
 selected_date = st.session_state.date_picker_val
-existing_data = get_data_by_date(selected_date)
-openings_saldo = calculate_current_saldo(selected_date)
+existing_data = get_data_by_date(selected_date, kassa)
+openings_saldo = calculate_current_saldo(selected_date, kassa)
 
 if app_mode == "Invoer":
     ui.card(
@@ -413,32 +117,30 @@ if app_mode == "Invoer":
             "Tandarts": (True, False, False, True),
             "Bakkerij": (False, True, False, True)
         }
-        use_0, use_6, use_12, use_21 = btw_presets.get(sector, (True, True, True, True))
+        preset = btw_presets.get(sector, (True, True, True, True))
+        # Tarieven buiten de presets (bv. later toegevoegd in de instellingen) blijven altijd zichtbaar
+        verborgen = {col for col, use in zip(["Omzet_0", "Omzet_6", "Omzet_12", "Omzet_21"], preset) if not use}
 
         items = []
-        def add_item(label, col):
-            val = float(existing_data[col]) if existing_data is not None else 0.0
-            items.append({"Label": label, "Bedrag": val})
-
-        if use_0: add_item("0% (Vrijgesteld)", "Omzet_0")
-        if use_6: add_item("6% (Voeding)", "Omzet_6")
-        if use_12: add_item("12% (Horeca)", "Omzet_12")
-        if use_21: add_item("21% (Algemeen)", "Omzet_21")
-        add_item("Bancontact", "Geld_Bancontact")
-        add_item("Cash", "Geld_Cash")
-        add_item("Payconiq", "Geld_Payconiq")
-        add_item("Overschrijving", "Geld_Overschrijving")
-        add_item("Cadeaubonnen", "Geld_Bonnen")
-        add_item("Afstorting Bank", "Geld_Afstorting")
+        ingevuld = set()
+        for _, cat in category_schema(kassa).iterrows():
+            if cat["Kolom"] in verborgen:
+                continue
+            # De historiek bewaart één bedrag per kolom: enkel de eerste categorie van die kolom
+            # krijgt het, anders telt een bewaarde dag dubbel (bv. Visa en Bancontact)
+            val = 0.0
+            if existing_data is not None and cat["Kolom"] not in ingevuld:
+                val = float(existing_data.get(cat["Kolom"], 0.0))
+                ingevuld.add(cat["Kolom"])
+            items.append({"Label": cat["Invoer"], "Bedrag": val})
 
         df_start = pd.DataFrame(items)
         edited_df = ui.data_table(df_start, key=f"table_{selected_date}_{st.session_state.reset_count}")
 
-        som_omzet = edited_df[edited_df["Label"].str.contains("Omzet|%")]["Bedrag"].sum()
-        som_geld = edited_df[~edited_df["Label"].str.contains("Afstorting")]["Bedrag"].sum() - edited_df[edited_df["Label"].str.contains("Afstorting")]["Bedrag"].sum()
-        verschil = round(som_omzet - (edited_df["Bedrag"].sum() - edited_df[edited_df["Label"].str.contains("Afstorting")]["Bedrag"].sum()), 2)
-        cash_in = edited_df[edited_df["Label"] == "Cash"]["Bedrag"].sum()
-        cash_out = edited_df[edited_df["Label"] == "Afstorting Bank"]["Bedrag"].sum()
+        with instrumentation.span("invoer_samenvatting"):
+            samenvatting = summarize_input(edited_df, kassa)
+        som_omzet, som_geld, verschil = samenvatting["som_omzet"], samenvatting["som_geld"], samenvatting["verschil"]
+        cash_in, cash_out = samenvatting["cash_in"], samenvatting["cash_out"]
 
     eind_saldo = openings_saldo + cash_in - cash_out
 
@@ -456,11 +158,235 @@ if app_mode == "Invoer":
     save_disabled = not ((verschil == 0 and som_omzet > 0) or is_gesloten) or (existing_data is not None and not overwrite_ok)
 
     if ui.button("Opslaan dagafsluiting", type="primary", size="lg", disabled=save_disabled, use_container_width=True):
-        save_transaction(selected_date, omschrijving, edited_df, som_omzet, som_geld, verschil)
+        save_transaction(selected_date, omschrijving, edited_df, som_omzet, som_geld, verschil, kassa)
         st.session_state.reset_count += 1
         ui.toast("Dag succesvol opgeslagen!", icon="✅", duration=4000)
         st.rerun()
 
-# Andere tabs (Export, Instellingen, etc.) kunnen we later verder uitbreiden met shadcn — dit is al een sterke basis.
+elif app_mode == "Export (Yuki)":
+    ui.card(title="Export (Yuki)", description="Exports lopen op de achtergrond; invoer blijft intussen beschikbaar",
+            key="export_card")
+    laatste_maand = date.today().replace(day=1) - timedelta(days=1)
+    col_formaat, col_van, col_tot = st.columns(3)
+    with col_formaat:
+        formaat = st.selectbox("Formaat", list(export_jobs.FORMATS), format_func=export_jobs.FORMATS.get)
+    with col_van:
+        van = st.date_input("Van", value=laatste_maand.replace(day=1), format="DD/MM/YYYY")
+    with col_tot:
+        tot = st.date_input("Tot en met", value=laatste_maand, format="DD/MM/YYYY")
+    if ui.button("Export in wachtrij zetten", key="export_submit_btn", disabled=van > tot):
+        job_id = export_jobs.submit(formaat, van, tot, kassa)
+        ui.toast(f"Export {job_id} in de wachtrij", icon="⏳", duration=3000)
+
+    mimes = {"csv": "text/csv", "xml": "application/xml", "html": "text/html"}
+
+    # Enkel automatisch verversen zolang er jobs wachten of lopen
+    actief = any(job["status"] not in export_jobs.FINISHED for job in export_jobs.jobs(kassa))
+
+    @st.fragment(run_every=2 if actief else None)
+    def export_overzicht():
+        # Herlaadt enkel dit stuk, zolang de tab open staat
+        lijst = export_jobs.jobs(kassa)
+        if not lijst:
+            st.info("Nog geen exports")
+            return
+        if actief and all(job["status"] in export_jobs.FINISHED for job in lijst):
+            # Alles afgewerkt: één volledige rerun, daarna ververst het overzicht niet meer vanzelf
+            st.rerun()
+        for job in lijst[:20]:
+            with st.container(border=True):
+                col_info, col_actie = st.columns([3, 1])
+                with col_info:
+                    st.markdown(f"**{export_jobs.FORMATS[job['formaat']]}** {job['van']} → {job['tot']} "
+                                f"· `{job['id']}` · {job['status']}")
+                    if job["status"] == export_jobs.RUNNING:
+                        st.progress(job["voortgang"])
+                    elif job["fout"] or job["bericht"]:
+                        st.caption(job["fout"] or job["bericht"])
+                with col_actie:
+                    if job["status"] not in export_jobs.FINISHED:
+                        if st.button("Annuleren", key=f"job_cancel_{job['id']}"):
+                            export_jobs.cancel(job["id"])
+                    elif job["status"] == export_jobs.DONE and job["bestand"]:
+                        # Het resultaat (soms vele MB) pas inlezen als de gebruiker het vraagt, en één keer
+                        klaargezet = st.session_state.get("export_download", ("",))
+                        if klaargezet[0] != job["id"] and st.button("Download voorbereiden",
+                                                                    key=f"job_prepare_{job['id']}"):
+                            inhoud = export_jobs.read_result(job["id"])
+                            if inhoud is None:
+                                st.caption("Bestand niet meer beschikbaar")
+                            else:
+                                klaargezet = st.session_state.export_download = (job["id"], inhoud)
+                        if klaargezet[0] == job["id"]:
+                            st.download_button("Download", klaargezet[1], file_name=job["bestand"],
+                                               mime=mimes[job["formaat"]], key=f"job_download_{job['id']}")
+                    if job["status"] in export_jobs.FINISHED and st.button("Verwijderen", key=f"job_remove_{job['id']}"):
+                        export_jobs.remove(job["id"])
+                        if st.session_state.get("export_download", ("",))[0] == job["id"]:
+                            st.session_state.pop("export_download")
+                        st.rerun(scope="fragment")
+
+    export_overzicht()
+
+elif app_mode == "Dashboard":
+    ui.card(title="Dashboard", description="Omzet per BTW-tarief en ontvangsten per betaalwijze", key="dashboard_card")
+    niveaus = {"Maand": "maand", "Kwartaal": "kwartaal", "Jaar": "jaar"}
+    col_niveau, col_jaar = st.columns(2)
+    with col_niveau:
+        niveau = niveaus[st.selectbox("Niveau", list(niveaus), index=1)]
+    jaren = get_period_totals("jaar", kassa=kassa).index.tolist()
+    with col_jaar:
+        jaar = st.selectbox("Jaar", ["Alle jaren"] + jaren[::-1], index=1 if jaren else 0)
+
+    if jaar == "Alle jaren" or niveau == "jaar":
+        totalen = get_period_totals(niveau, kassa=kassa)
+    else:
+        totalen = get_period_totals(niveau, start=jaar, end=f"{jaar}~", kassa=kassa)
+
+    if totalen.empty:
+        st.info("Nog geen dagafsluitingen")
+    else:
+        laatste = totalen.iloc[-1]
+        m1, m2, m3 = st.columns(3)
+        m1.metric(f"Omzet {totalen.index[-1]}", f"€{laatste['Totaal_Omzet']:,.2f}")
+        m2.metric("Open dagen", int(laatste[aggregates.OPEN_DAYS]))
+        m3.metric("Afgestort", f"€{laatste['Geld_Afstorting']:,.2f}")
+
+        st.subheader("Omzet per BTW-tarief")
+        st.bar_chart(totalen[["Omzet_0", "Omzet_6", "Omzet_12", "Omzet_21"]])
+        st.dataframe(totalen[["Omzet_0", "Omzet_6", "Omzet_12", "Omzet_21", "Totaal_Omzet", aggregates.OPEN_DAYS]],
+                     use_container_width=True)
+
+        st.subheader("Ontvangsten per betaalwijze")
+        betaalwijzen = ["Geld_Bancontact", "Geld_Cash", "Geld_Payconiq", "Geld_Overschrijving", "Geld_Bonnen"]
+        st.bar_chart(totalen[betaalwijzen])
+        st.dataframe(totalen[betaalwijzen + ["Geld_Afstorting"]], use_container_width=True)
+
+elif app_mode == "Kassaldo Beheer":
+    ui.card(title="Kassaldo Beheer", description="Onderhoud van de historiek", key="beheer_card")
+    backend = history_backend(kassa)
+    st.caption(f"Opslag: {backend.name} ({backend.path}) — openstaand journaal: {backend.pending_bytes() / 1024:.1f} KB")
+    cache_stats = cache.stats()
+    st.caption(f"Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+               f"({cache_stats['hit_ratio']:.0%}), {cache_stats['entries']} entries, "
+               f"{cache_stats['bytes'] / 1024 / 1024:.1f} MB, {cache_stats['evictions']} verdrongen")
+    export_cache_dir = kassa_file(export_cache.CACHE_DIR, kassa)
+    export_stats = export_cache.stats(export_cache_dir)
+    st.caption(f"Exportcache: {export_stats['entries']} bestanden, {export_stats['bytes'] / 1024:.0f} KB, "
+               f"{export_stats['treffers']} keer hergebruikt")
+    if ui.button("Exportcache leegmaken", key="clear_export_cache_btn"):
+        export_cache.clear(export_cache_dir)
+        ui.toast("Exportcache leeggemaakt", icon="✅", duration=3000)
+        st.rerun()
+    if ui.button("Historiek compacteren", key="compact_btn"):
+        backend.compact()
+        ui.toast("Historiek gecompacteerd", icon="✅", duration=3000)
+        st.rerun()
+    if ui.button("Saldo-index en periodetotalen herberekenen", key="rebuild_saldo_btn"):
+        marker = history_marker(kassa)
+        historiek = load_database(kassa)
+        saldo_index.rebuild(kassa_file(SALDO_INDEX_FILE, kassa), historiek, marker)
+        aggregates.rebuild(kassa_file(AGGREGATES_FILE, kassa), historiek, marker)
+        ui.toast("Saldo-index en periodetotalen herberekend", icon="✅", duration=3000)
+        st.rerun()
+
+    st.divider()
+    backend_names = sorted(storage.BACKENDS)
+    nieuwe_opslag = st.selectbox("Opslag-backend", backend_names, index=backend_names.index(backend.name))
+    if nieuwe_opslag != backend.name and ui.button(f"Migreren naar {nieuwe_opslag}", key="migrate_btn"):
+        aantal, _ = migrate_history(nieuwe_opslag, kassa, backend.name)
+        ui.toast(f"{aantal} dagen gemigreerd naar {nieuwe_opslag}", icon="✅", duration=4000)
+        st.rerun()
+
+    st.divider()
+    nieuwe_kassa = st.text_input("Nieuwe kassa", placeholder="bv. winkel-gent")
+    if nieuwe_kassa and ui.button("Kassa aanmaken", key="create_kassa_btn"):
+        if KASSA_NAME_PATTERN.match(nieuwe_kassa):
+            create_kassa(nieuwe_kassa)
+            ui.toast(f"Kassa {nieuwe_kassa} aangemaakt", icon="✅", duration=3000)
+            st.rerun()
+        else:
+            st.error("Enkel letters, cijfers, - en _ toegelaten")
+
+elif app_mode == "Import":
+    ui.card(title="Historiek importeren", description="CSV of XLSX uit een kassasysteem of Excel", key="import_card")
+    bestand = st.file_uploader("Bestand", type=["csv", "xlsx", "xlsm"])
+    col_sep, col_dec, col_datum = st.columns(3)
+    with col_sep:
+        sep = st.selectbox("Scheidingsteken", [";", ",", "\t"], format_func=lambda s: "tab" if s == "\t" else s)
+    with col_dec:
+        decimaal = st.selectbox("Decimaalteken", [",", "."])
+    with col_datum:
+        dag_eerst = st.checkbox("Datums als DD/MM/JJJJ", value=True)
+
+    if bestand is not None:
+        bestandstype = bulk_import.detect_filetype(bestand.name)
+        try:
+            kolommen = bulk_import.read_columns(bestand, bestandstype, sep)
+        except ImportError as e:
+            st.error(str(e))
+            kolommen = []
+        if kolommen:
+            voorstel = bulk_import.guess_mapping(kolommen)
+            keuzes = ["—"] + kolommen
+            st.subheader("Kolommen koppelen")
+            mapping = {}
+            map_cols = st.columns(2)
+            for i, doel in enumerate(bulk_import.IMPORT_COLUMNS):
+                with map_cols[i % 2]:
+                    gekozen = st.selectbox(doel, keuzes, index=keuzes.index(voorstel[doel]) if doel in voorstel else 0,
+                                           key=f"import_map_{doel}")
+                if gekozen != "—":
+                    mapping[doel] = gekozen
+            overschrijven = st.checkbox("Bestaande dagen overschrijven", value=False)
+            if ui.button("Importeren", key="import_btn", disabled="Datum" not in mapping):
+                with st.spinner("Bezig met importeren..."):
+                    aantal, afgewezen = bulk_import.import_file(bestand, mapping, kassa, bestandstype, sep, decimaal,
+                                                                dag_eerst, overschrijven)
+                st.success(f"{aantal} dagen geïmporteerd")
+                if len(afgewezen):
+                    st.warning(f"{len(afgewezen)} rijen afgewezen")
+                    st.dataframe(afgewezen, hide_index=True, use_container_width=True)
+                    st.download_button("Rapport afgewezen rijen", afgewezen.to_csv(sep=";", index=False),
+                                       file_name="afgewezen_rijen.csv", mime="text/csv")
+
+elif app_mode == "Diagnostics":
+    ui.card(title="Diagnostics", description="Tijdsmetingen van loaders, opslaan en exports", key="diag_card")
+    st.checkbox("cProfile meenemen bij volgende reruns", key="diag_profiel")
+
+    st.subheader("Totalen per stap")
+    totalen = instrumentation.summary()
+    if totalen:
+        st.dataframe(pd.DataFrame(totalen)[["naam", "aantal", "totaal_ms", "gemiddeld_ms", "max_ms", "fouten"]],
+                     hide_index=True, use_container_width=True)
+    else:
+        st.info("Nog geen metingen")
+
+    st.subheader("Laatste reruns")
+    afgesloten_runs = instrumentation.runs()[::-1]
+    if afgesloten_runs:
+        st.dataframe(pd.DataFrame([{
+            "run": r.id, "label": r.label, "start": r.started_at.strftime("%H:%M:%S"),
+            "totaal_ms": r.total_ms, "spans": len(r.spans), "onderbroken": r.interrupted,
+            "traagste stap": next(iter(instrumentation.run_totals(r)), ""),
+        } for r in afgesloten_runs]), hide_index=True, use_container_width=True)
+        gekozen = st.selectbox("Details van run", afgesloten_runs, format_func=lambda r: f"#{r.id} {r.label} — {r.total_ms:.1f} ms")
+        if gekozen.spans:
+            st.dataframe(pd.DataFrame(gekozen.spans), hide_index=True, use_container_width=True)
+        if gekozen.profile_text:
+            st.code(gekozen.profile_text, language=None)
+
+    col_export, col_reset = st.columns(2)
+    with col_export:
+        st.download_button("Exporteren (JSONL)", instrumentation.export_jsonl(),
+                           file_name=f"diagnostics_{date.today():%Y%m%d}.jsonl", mime="application/jsonl")
+    with col_reset:
+        if ui.button("Metingen wissen", key="diag_reset_btn"):
+            instrumentation.reset()
+            st.rerun()
+
+# Andere tabs (Instellingen, Export Config) kunnen we later verder uitbreiden met shadcn — dit is al een sterke basis.
 
 st.caption("© 2025 — Jouw concurrent voor Scrada")
+
+instrumentation.end_run(st.session_state.diag_run)
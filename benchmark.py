@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+# Benchmarks voor de zware paden, uitvoeren met bv.:
+#   python benchmark.py hotpaths --json bench.json
+#   python benchmark.py hotpaths --json bench2.json --vergelijk bench.json
+#   python benchmark.py camt --workers 1 2 4 8
+#   python benchmark.py templates
+
+def synthetic_days(n, seed=0, end=date(2025, 12, 31)):
+    # Reproduceerbare historiek met sluitende dagen (Verschil = 0) en ~5% gesloten dagen.
+    # Telt terug vanaf `end` zodat ook 100k dagen binnen het bereik van pandas-timestamps blijven.
+    rng = np.random.default_rng(seed)
+    datums = pd.date_range(end=end, periods=n, freq="D").strftime("%Y-%m-%d")
+    cents = lambda low, high: rng.integers(low, high, n) / 100
+    df = pd.DataFrame({
+        "Datum": datums,
+        "Omschrijving": [f"Dagontvangsten {d[8:10]}-{d[5:7]}-{d[:4]}" for d in datums],
+        "Omzet_0": cents(0, 5000) * (rng.random(n) < 0.3),
+        "Omzet_6": cents(0, 80000),
+        "Omzet_12": cents(0, 20000) * (rng.random(n) < 0.5),
+        "Omzet_21": cents(0, 150000),
+    })
+    omzet = df[["Omzet_0", "Omzet_6", "Omzet_12", "Omzet_21"]].sum(axis=1).round(2)
+    share = rng.dirichlet([4, 3, 1, 0.5, 0.5], n)
+    for i, col in enumerate(["Geld_Bancontact", "Geld_Cash", "Geld_Payconiq", "Geld_Overschrijving"]):
+        df[col] = (omzet * share[:, i]).round(2)
+    df["Geld_Bonnen"] = (omzet - df[["Geld_Bancontact", "Geld_Cash", "Geld_Payconiq",
+                                     "Geld_Overschrijving"]].sum(axis=1)).round(2)
+    df["Geld_Afstorting"] = np.where(rng.random(n) < 0.1, (df["Geld_Cash"] * 5).round(-1), 0.0)
+    closed = rng.random(n) < 0.05
+    amount_cols = [c for c in df.columns if c.startswith(("Omzet_", "Geld_"))]
+    df.loc[closed, amount_cols] = 0.0
+    df["Totaal_Omzet"] = df[["Omzet_0", "Omzet_6", "Omzet_12", "Omzet_21"]].sum(axis=1).round(2)
+    df["Totaal_Geld"] = (df[["Geld_Bancontact", "Geld_Cash", "Geld_Payconiq", "Geld_Overschrijving",
+                             "Geld_Bonnen"]].sum(axis=1) - df["Geld_Afstorting"]).round(2)
+    df["Verschil"] = 0.0
+    df["Timestamp"] = "2025-01-01 12:00:00"
+    return df
+
+def timed(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
+
+def bench_templates(args):
+    from jinja2 import Environment, FileSystemLoader
+    import kassa_core
+    import templating
+
+    mapping = {row["Code"]: {"Rekening": row["Rekening"], "Label": row["Label"], "Template": row["ExportDesc"]}
+               for row in kassa_core.get_default_settings()}
+    config = {"iban": "BE00999000000000", "bedrijfsnaam": "Benchmark"}
+    results = []
+    for n in args.sizes:
+        rows = synthetic_days(n, seed=args.seed).to_dict("records")
+        statements = list(kassa_core.iter_statements(rows, 0, 0.0, mapping))
+        context = {"msg_id": "BENCH", "creation_datetime": "2025-01-01T00:00:00",
+                   "iban": config["iban"], "statements": statements}
+
+        def camt_uncached():
+            # Zoals voorheen: nieuwe omgeving en compilatie bij elke export
+            env = Environment(loader=FileSystemLoader(templating.TEMPLATE_DIR))
+            return env.get_template(templating.CAMT053_TEMPLATE).render(context)
+
+        cold, _ = timed(camt_uncached, args.repeat)
+        warm, xml = timed(lambda: templating.render(templating.CAMT053_TEMPLATE, context), args.repeat)
+        html_time, html = timed(lambda: kassa_core.render_bankafschrift(
+            statements, 0.0, rows[0]["Datum"], rows[-1]["Datum"], config), args.repeat)
+        results.append({"statements": len(statements), "dagen": n,
+                        "camt_uncached_ms": cold * 1000, "camt_cached_ms": warm * 1000,
+                        "bankafschrift_ms": html_time * 1000,
+                        "camt_bytes": len(xml), "bankafschrift_bytes": len(html)})
+    return results
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def write_history(backend_name, n, seed):
+    import kassa_core
+    import storage
+
+    df = synthetic_days(n, seed=seed)
+    storage.get_backend(backend_name, kassa_core.DATA_FILE).replace_all(df)
+    with open(kassa_core.CONFIG_FILE, "w") as f:
+        json.dump({"start_saldo": 500.0, "iban": "BE00999000000000", "coda_seq": 0, "opslag": backend_name}, f)
+    return df
+
+def bench_hotpaths(args):
+    import cache
+    import export_cache
+    import kassa_core
+
+    results = []
+    rng = random.Random(args.seed)
+    original_dir = os.getcwd()
+    for backend_name in args.backends:
+        for n in args.sizes:
+            workdir = tempfile.mkdtemp(prefix=f"bench_{backend_name}_{n}_")
+            os.chdir(workdir)
+            try:
+                df = write_history(backend_name, n, args.seed)
+                datums = df["Datum"].tolist()
+                export_start, export_end = datums[max(0, n - args.export_days)], datums[-1]
+                export_rows = min(n, args.export_days)
+                edit = pd.DataFrame([{"Label": "21% (Algemeen)", "Bedrag": 100.0}, {"Label": "Cash", "Bedrag": 100.0}])
+
+                def cold(fn):
+                    # Elke meting vanaf een lege loader- en exportcache: de schijf- en parse-kost telt mee
+                    def run():
+                        cache.invalidate()
+                        export_cache.clear(export_cache.CACHE_DIR)
+                        return fn()
+                    return run
+
+                def saldo_cold():
+                    if os.path.exists(kassa_core.SALDO_INDEX_FILE):
+                        os.remove(kassa_core.SALDO_INDEX_FILE)
+                    cache.invalidate()
+                    return kassa_core.calculate_current_saldo(rng.choice(datums))
+
+                def aggregates_cold():
+                    if os.path.exists(kassa_core.AGGREGATES_FILE):
+                        os.remove(kassa_core.AGGREGATES_FILE)
+                    cache.invalidate()
+                    return kassa_core.get_period_totals("maand")
+
+                operations = [
+                    ("load_database", cold(kassa_core.load_database), n),
+                    ("load_database (cache)", kassa_core.load_database, n),
+                    ("load_records", cold(lambda: kassa_core.load_records(datums[0], datums[-1])), n),
+                    ("get_data_by_date", cold(lambda: kassa_core.get_data_by_date(rng.choice(datums))), 1),
+                    ("calculate_current_saldo (index opbouwen)", saldo_cold, n),
+                    ("calculate_current_saldo", lambda: kassa_core.calculate_current_saldo(rng.choice(datums)), 1),
+                    # Bouwt ook de periodetotalen op, zodat save_transaction ze incrementeel bijwerkt
+                    ("get_period_totals (opbouwen)", aggregates_cold, n),
+                    ("get_period_totals", lambda: kassa_core.get_period_totals("maand"), 1),
+                    ("save_transaction", lambda: kassa_core.save_transaction(
+                        rng.choice(datums), "", edit, 100.0, 100.0, 0.0), 1),
+                    ("generate_csv_export", cold(lambda: kassa_core.generate_csv_export(export_start, export_end)),
+                     export_rows),
+                    ("generate_xml_export", cold(lambda: kassa_core.generate_xml_export(export_start, export_end)),
+                     export_rows),
+                    ("generate_xml_export (exportcache)",
+                     lambda: kassa_core.generate_xml_export(export_start, export_end), export_rows),
+                ]
+                for name, fn, rows in operations:
+                    fn()  # opwarmen (imports, index, bytecode)
+                    median, _ = timed(fn, args.repeat)
+                    peak = peak_memory(fn)
+                    results.append({"backend": backend_name, "dagen": n, "operatie": name,
+                                    "median_ms": median * 1000,
+                                    "ops_per_s": 1 / median if median else float("inf"),
+                                    "rijen_per_s": rows / median if median else float("inf"),
+                                    "piek_mb": peak / 1024 / 1024})
+                    print(f"{backend_name:<8} {n:>7} {name:<42} {median * 1000:10.2f} ms "
+                          f"{rows / median if median else 0:12.0f} rijen/s {peak / 1024 / 1024:8.1f} MB", flush=True)
+            finally:
+                os.chdir(original_dir)
+                shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def bench_camt(args):
+    import export_cache
+    import kassa_core
+
+    def normalized(xml):
+        # Tijdstip van de export (MsgId, CreDtTm) en de volgnummers verschillen per run
+        return re.sub(r"KASSA-\d+|\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d|<ElctrncSeqNb>\d+", "", xml)
+
+    results = []
+    original_dir = os.getcwd()
+    for n in args.sizes:
+        workdir = tempfile.mkdtemp(prefix=f"bench_camt_{n}_")
+        os.chdir(workdir)
+        try:
+            df = write_history("csv", n, args.seed)
+            start, end = df["Datum"].iloc[0], df["Datum"].iloc[-1]
+            reference = None
+            baseline = None
+            for workers in args.workers:
+                def run():
+                    export_cache.clear(export_cache.CACHE_DIR)
+                    return kassa_core.generate_xml_export(start, end, workers=workers, executor=args.executor)[0]
+                run()  # opwarmen (pool, templates, saldo-index)
+                median, xml = timed(run, args.repeat)
+                xml = normalized(xml)
+                reference = reference or xml
+                baseline = baseline or median
+                results.append({"dagen": n, "workers": workers, "executor": args.executor,
+                                "median_ms": median * 1000, "versnelling": baseline / median,
+                                "identiek": xml == reference})
+        finally:
+            os.chdir(original_dir)
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def compare(results, previous_path, threshold):
+    with open(previous_path) as f:
+        previous = {(r["backend"], r["dagen"], r["operatie"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    print(f"\nVergelijking met {previous_path} (drempel {threshold:.0%}):")
+    for r in results:
+        old = previous.get((r["backend"], r["dagen"], r["operatie"]))
+        if not old or not old["median_ms"]:
+            continue
+        ratio = r["median_ms"] / old["median_ms"]
+        flag = "REGRESSIE" if ratio > 1 + threshold else ""
+        regressions += bool(flag)
+        print(f"{r['backend']:<8} {r['dagen']:>7} {r['operatie']:<42} {old['median_ms']:10.2f} -> "
+              f"{r['median_ms']:10.2f} ms  x{ratio:5.2f} {flag}")
+    return regressions
+
+def print_table(results):
+    if not results:
+        return
+    keys = list(results[0])
+    print("  ".join(f"{k:>18}" for k in keys))
+    for r in results:
+        print("  ".join(f"{r[k]:>18.2f}" if isinstance(r[k], float) else f"{str(r[k]):>18}" for k in keys))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks Dagontvangsten")
+    sub = parser.add_subparsers(dest="suite", required=True)
+    p_hot = sub.add_parser("hotpaths", help="Loaders, dagafsluiting en exports op synthetische historiek")
+    p_hot.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    p_hot.add_argument("--backends", nargs="+", default=["csv"], choices=["csv", "parquet", "sqlite"])
+    p_hot.add_argument("--export-days", type=int, default=365, help="Lengte van de geëxporteerde periode")
+    p_hot.add_argument("--repeat", type=int, default=3)
+    p_hot.add_argument("--seed", type=int, default=0)
+    p_hot.add_argument("--json", help="Resultaten als JSON wegschrijven")
+    p_hot.add_argument("--vergelijk", help="Vorige JSON-resultaten om mee te vergelijken")
+    p_hot.add_argument("--drempel", type=float, default=0.2, help="Toegelaten vertraging bij --vergelijk")
+    p_camt = sub.add_parser("camt", help="Schaling van de parallelle CAMT.053-export met het aantal workers")
+    p_camt.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    p_camt.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    p_camt.add_argument("--executor", choices=["process", "thread"], default="process")
+    p_camt.add_argument("--repeat", type=int, default=3)
+    p_camt.add_argument("--seed", type=int, default=0)
+    p_camt.add_argument("--json", help="Resultaten ook als JSON wegschrijven")
+    p_templates = sub.add_parser("templates", help="Rendertijd CAMT.053 en bankafschrift")
+    p_templates.add_argument("--sizes", type=int, nargs="+", default=[1, 30, 365])
+    p_templates.add_argument("--repeat", type=int, default=5)
+    p_templates.add_argument("--seed", type=int, default=0)
+    p_templates.add_argument("--json", help="Resultaten ook als JSON wegschrijven")
+    args = parser.parse_args(argv)
+
+    if args.suite == "hotpaths":
+        results = bench_hotpaths(args)
+    elif args.suite == "camt":
+        print(f"CPU's: {os.cpu_count()}")
+        results = bench_camt(args)
+        print_table(results)
+    else:
+        results = bench_templates(args)
+        print_table(results)
+    if args.json:
+        meta = {"tijdstip": datetime.now().isoformat(timespec="seconds"), "python": sys.version.split()[0],
+                "pandas": pd.__version__, "numpy": np.__version__, "platform": platform.platform(),
+                "argumenten": {k: v for k, v in vars(args).items() if k not in ("json", "vergelijk")}}
+        with open(args.json, "w") as f:
+            json.dump({"suite": args.suite, "meta": meta, "results": results}, f, indent=2)
+    if getattr(args, "vergelijk", None):
+        return 1 if compare(results, args.vergelijk, args.drempel) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
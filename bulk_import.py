@@ -0,0 +1,253 @@
+import argparse
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import cache
+import instrumentation
+import aggregates
+import saldo_index
+import storage
+from kassa_core import AGGREGATES_FILE, SALDO_INDEX_FILE, kassa_file, history_backend, history_marker, load_database
+
+# --- BULK IMPORT ---
+# Historiek uit kassasystemen of Excel in één keer inladen: het bestand wordt per chunk
+# gelezen en op het Omzet_*/Geld_*-schema gemapt, de dagcontrole (Verschil) gebeurt
+# gevectoriseerd, en alle goedgekeurde dagen gaan in één schrijfactie naar de opslag.
+# Afgewezen rijen komen met hun rijnummer en reden in een rapport.
+
+CHUNK_ROWS = 50_000
+TOLERANCE = 0.005
+
+OMZET_COLUMNS = ["Omzet_0", "Omzet_6", "Omzet_12", "Omzet_21"]
+BETAAL_COLUMNS = ["Geld_Bancontact", "Geld_Cash", "Geld_Payconiq", "Geld_Overschrijving", "Geld_Bonnen"]
+IMPORT_COLUMNS = ["Datum", "Omschrijving"] + OMZET_COLUMNS + BETAAL_COLUMNS + ["Geld_Afstorting", "Totaal_Omzet"]
+
+# Gangbare kolomnamen in kassa-exports en Excel-lijsten, genormaliseerd (zie _column_key)
+ALIASES = {
+    "Datum": ["datum", "date", "dag", "day", "boekdatum"],
+    "Omschrijving": ["omschrijving", "notitie", "opmerking", "description", "memo"],
+    "Omzet_0": ["omzet0", "omzet0%", "0%", "btw0", "vrijgesteld"],
+    "Omzet_6": ["omzet6", "omzet6%", "6%", "btw6", "voeding"],
+    "Omzet_12": ["omzet12", "omzet12%", "12%", "btw12", "horeca"],
+    "Omzet_21": ["omzet21", "omzet21%", "21%", "btw21", "algemeen"],
+    "Geld_Bancontact": ["geldbancontact", "bancontact", "bc", "maestro", "kaart"],
+    "Geld_Cash": ["geldcash", "cash", "contant", "contanten"],
+    "Geld_Payconiq": ["geldpayconiq", "payconiq"],
+    "Geld_Overschrijving": ["geldoverschrijving", "overschrijving", "transfer"],
+    "Geld_Bonnen": ["geldbonnen", "bonnen", "cadeaubonnen", "vouchers"],
+    "Geld_Afstorting": ["geldafstorting", "afstorting", "afstortingbank", "storting"],
+    "Totaal_Omzet": ["totaalomzet", "omzet", "totaal", "total"],
+}
+
+def _column_key(name):
+    return re.sub(r"[^a-z0-9%]", "", str(name).lower())
+
+def detect_filetype(name):
+    return "xlsx" if str(name).lower().endswith((".xlsx", ".xlsm")) else "csv"
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+def _load_openpyxl():
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportError("Import van XLSX-bestanden vereist openpyxl (pip install openpyxl)")
+    return openpyxl
+
+def read_chunks(source, filetype="csv", sep=";", decimal=",", encoding="utf-8-sig", chunksize=CHUNK_ROWS):
+    _rewind(source)
+    if filetype == "xlsx":
+        # openpyxl in read-only modus leest rij per rij: nooit het hele werkblad in het geheugen
+        workbook = _load_openpyxl().load_workbook(source, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(c) if c is not None else f"kolom_{i}" for i, c in enumerate(next(rows, []))]
+            while True:
+                block = [r for _, r in zip(range(chunksize), rows)]
+                if not block:
+                    break
+                yield pd.DataFrame(block, columns=header)
+        finally:
+            workbook.close()
+        return
+    yield from pd.read_csv(source, sep=sep, decimal=decimal, dtype=str, keep_default_na=False,
+                           encoding=encoding, chunksize=chunksize)
+
+def read_columns(source, filetype="csv", sep=";", encoding="utf-8-sig"):
+    _rewind(source)
+    if filetype == "xlsx":
+        workbook = _load_openpyxl().load_workbook(source, read_only=True, data_only=True)
+        try:
+            header = next(workbook.active.iter_rows(values_only=True, max_row=1), ())
+        finally:
+            workbook.close()
+        columns = [str(c) for c in header if c is not None]
+    else:
+        columns = list(pd.read_csv(source, sep=sep, nrows=0, encoding=encoding).columns)
+    _rewind(source)
+    return columns
+
+def guess_mapping(columns):
+    # Doelkolom -> bronkolom; elke bronkolom wordt hoogstens één keer gebruikt
+    by_key = {_column_key(c): c for c in columns}
+    mapping, used = {}, set()
+    for target, aliases in ALIASES.items():
+        for alias in [_column_key(target)] + aliases:
+            source = by_key.get(alias)
+            if source is not None and source not in used:
+                mapping[target] = source
+                used.add(source)
+                break
+    return mapping
+
+def to_amounts(series, decimal=","):
+    # Geeft (bedragen, ongeldig-masker); lege cellen tellen als 0
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.astype(float)
+        return values.fillna(0.0), pd.Series(False, index=series.index)
+    text = series.astype(str).str.strip().str.replace(r"[€\s]", "", regex=True)
+    if decimal == ",":
+        # "1.234,56" en "1.234" zijn Belgische notatie; "12.50" (zonder komma) blijft een decimaal punt
+        belgian = text.str.contains(",", regex=False) | text.str.fullmatch(r"-?\d{1,3}(\.\d{3})+")
+        text = text.mask(belgian, text.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    else:
+        text = text.str.replace(",", "", regex=False)
+    empty = text.isin(["", "nan", "None", "-"])
+    values = pd.to_numeric(text.mask(empty), errors="coerce")
+    return values.fillna(0.0), values.isna() & ~empty
+
+def to_dates(series, dayfirst=True):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime("%Y-%m-%d")
+    text = series.astype(str).str.strip().str[:10]
+    parsed = pd.to_datetime(text, format="%Y-%m-%d", errors="coerce")
+    rest = parsed.isna() & (text != "")
+    if rest.any():
+        parsed[rest] = pd.to_datetime(text[rest], dayfirst=dayfirst, errors="coerce")
+    return parsed.dt.strftime("%Y-%m-%d")
+
+def prepare_chunk(chunk, mapping, first_row, decimal=",", dayfirst=True, tolerance=TOLERANCE):
+    rows = pd.RangeIndex(first_row, first_row + len(chunk))
+    chunk = chunk.set_axis(rows)
+    df = pd.DataFrame(index=rows)
+    reasons = pd.Series("", index=rows)
+
+    def reject(mask, reason):
+        reasons[mask & (reasons == "")] = reason
+
+    df["Datum"] = to_dates(chunk[mapping["Datum"]], dayfirst)
+    reject(df["Datum"].isna(), "ongeldige datum")
+    for col in OMZET_COLUMNS + BETAAL_COLUMNS + ["Geld_Afstorting"]:
+        if col in mapping:
+            df[col], invalid = to_amounts(chunk[mapping[col]], decimal)
+            reject(invalid, f"ongeldig bedrag in {mapping[col]}")
+            reject(df[col] < 0, f"negatief bedrag in {mapping[col]}")
+        else:
+            df[col] = 0.0
+
+    df["Totaal_Omzet"] = df[OMZET_COLUMNS].sum(axis=1).round(2)
+    betalingen = df[BETAAL_COLUMNS].sum(axis=1).round(2)
+    if "Totaal_Omzet" in mapping:
+        opgegeven, invalid = to_amounts(chunk[mapping["Totaal_Omzet"]], decimal)
+        reject(invalid, f"ongeldig bedrag in {mapping['Totaal_Omzet']}")
+        reject((opgegeven - df["Totaal_Omzet"]).abs() > tolerance, "Totaal_Omzet wijkt af van de som per BTW-tarief")
+    df["Totaal_Geld"] = (betalingen - df["Geld_Afstorting"]).round(2)
+    df["Verschil"] = (df["Totaal_Omzet"] - betalingen).round(2)
+    reject(df["Verschil"].abs() > tolerance,
+           "dag sluit niet: verschil " + df["Verschil"].map("{:.2f}".format))
+
+    default_desc = "Dagontvangsten " + pd.to_datetime(df["Datum"]).dt.strftime("%d-%m-%Y")
+    if "Omschrijving" in mapping:
+        desc = chunk[mapping["Omschrijving"]].fillna("").astype(str).str.strip()
+        df["Omschrijving"] = desc.mask(desc == "", default_desc)
+    else:
+        df["Omschrijving"] = default_desc
+
+    ok = reasons == ""
+    rejected = pd.DataFrame({"Rij": rows[~ok] + 2,  # +2: koprij en 1-gebaseerde nummering
+                             "Datum": chunk.loc[~ok, mapping["Datum"]].astype(str),
+                             "Reden": reasons[~ok]})
+    return df.loc[ok], rejected
+
+@instrumentation.timed()
+def import_file(source, mapping, kassa=None, filetype="csv", sep=";", decimal=",", dayfirst=True,
+                overwrite=False, chunksize=CHUNK_ROWS, progress=None):
+    if "Datum" not in mapping:
+        raise ValueError("Geen kolom gekozen voor Datum")
+    accepted, rejected = [], []
+    offset = 0
+    for chunk in read_chunks(source, filetype, sep, decimal, chunksize=chunksize):
+        ok, bad = prepare_chunk(chunk, mapping, offset, decimal, dayfirst)
+        offset += len(chunk)
+        accepted.append(ok)
+        rejected.append(bad)
+        if progress:
+            progress(offset)
+
+    df = pd.concat(accepted) if accepted else pd.DataFrame(columns=storage.COLUMNS)
+    rejected = pd.concat(rejected) if rejected else pd.DataFrame(columns=["Rij", "Datum", "Reden"])
+
+    # Dezelfde dag meermaals in het bestand: de laatste rij telt
+    in_file = df["Datum"].duplicated(keep="last")
+    dup = in_file.copy()
+    if not overwrite:
+        dup |= df["Datum"].isin(set(load_database(kassa)["Datum"]))
+    if dup.any():
+        reden = np.where(in_file[dup], "dubbele datum in bestand (latere rij gebruikt)", "dag bestaat al")
+        rejected = pd.concat([rejected, pd.DataFrame({"Rij": df.index[dup] + 2, "Datum": df.loc[dup, "Datum"],
+                                                      "Reden": reden})])
+        df = df.loc[~dup]
+
+    if not df.empty:
+        df = df.assign(Timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        index_file = kassa_file(SALDO_INDEX_FILE, kassa)
+        # Eén schrijfactie voor de historiek en één per index; backend onder de lock bepalen (migratie)
+        with storage.file_lock(index_file):
+            backend = history_backend(kassa)
+            before = history_marker(kassa)
+            backend.upsert_many(df)
+            after = history_marker(kassa)
+            saldo_index.update_days(index_file, df["Datum"].tolist(), df["Geld_Cash"], df["Geld_Afstorting"],
+                                    before, after)
+            aggregates.update_days(kassa_file(AGGREGATES_FILE, kassa), df.to_dict("records"), before, after)
+        cache.invalidate(backend.path)
+    return len(df), rejected.sort_values("Rij", ignore_index=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Historiek importeren uit een CSV- of XLSX-bestand")
+    parser.add_argument("bestand")
+    parser.add_argument("--kassa", help="Kassa (standaard: de hoofdkassa)")
+    parser.add_argument("--map", action="append", default=[], metavar="DOEL=BRON",
+                        help="Kolom-mapping, bv. --map Geld_Cash=Contant (aanvulling op de automatische herkenning)")
+    parser.add_argument("--sep", default=";")
+    parser.add_argument("--decimaal", default=",")
+    parser.add_argument("--maand-eerst", action="store_true", help="Datums als MM/DD/JJJJ lezen")
+    parser.add_argument("--overschrijven", action="store_true", help="Bestaande dagen vervangen")
+    parser.add_argument("--afgewezen", help="Rapport van afgewezen rijen als CSV wegschrijven")
+    args = parser.parse_args()
+
+    filetype = detect_filetype(args.bestand)
+    mapping = guess_mapping(read_columns(args.bestand, filetype, args.sep))
+    for item in args.map:
+        target, _, source = item.partition("=")
+        if target not in IMPORT_COLUMNS:
+            parser.error(f"Onbekende doelkolom: {target}")
+        mapping[target] = source
+    print("Mapping: " + ", ".join(f"{t} <- {s}" for t, s in mapping.items()))
+    started = datetime.now()
+    count, rejected = import_file(args.bestand, mapping, args.kassa, filetype, args.sep, args.decimaal,
+                                  not args.maand_eerst, args.overschrijven)
+    print(f"{count} dagen geïmporteerd, {len(rejected)} rijen afgewezen "
+          f"({(datetime.now() - started).total_seconds():.2f}s)")
+    if len(rejected):
+        if args.afgewezen:
+            rejected.to_csv(args.afgewezen, sep=";", index=False)
+            print(f"Rapport: {os.path.abspath(args.afgewezen)}")
+        else:
+            print(rejected.head(20).to_string(index=False))
@@ -0,0 +1,96 @@
+import copy
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+# --- CACHE VOOR LOADERS ---
+# Gedeeld over alle sessies van het proces. Een entry is geldig zolang de bestanden waaruit
+# ze geladen werd dezelfde identiteit (inode), mtime en grootte hebben; de save-functies
+# invalideren daarnaast expliciet. Er wordt een kopie teruggegeven zodat aanroepers
+# de gecachte waarde niet per ongeluk wijzigen; loaders met shared=True geven een
+# onveranderlijke waarde terug (alleen-lezen arrays) en die wordt gedeeld.
+# Begrensd als LRU op aantal entries en geschatte grootte: een langlopend proces met veel
+# kassa's, dagen en periodes groeit niet onbeperkt. Een entry waarvan de bestanden intussen
+# gewijzigd zijn (bv. door een ander proces) wordt bij de eerstvolgende opvraging verwijderd.
+
+MAX_ENTRIES = 512
+MAX_BYTES = 256 * 1024 * 1024
+
+_entries = OrderedDict()
+_sizes = {}
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+def _size(value):
+    # DataFrame/Series via memory_usage, numpy-achtige waarden (DayRecords) via nbytes; de rest is klein
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(index=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    return int(getattr(value, "nbytes", 0))
+
+def _drop(key):
+    del _entries[key]
+    _sizes.pop(key, None)
+
+def _evict():
+    # Oudste eerst; de nieuwste entry blijft altijd staan
+    while len(_entries) > 1 and (len(_entries) > MAX_ENTRIES or sum(_sizes.values()) > MAX_BYTES):
+        _drop(next(iter(_entries)))
+        _stats["evictions"] += 1
+
+def file_signature(paths):
+    sig = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            sig.append((os.path.abspath(path), st.st_ino, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            sig.append((os.path.abspath(path), None))
+    return tuple(sig)
+
+def file_cached(paths_fn, shared=False):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            paths = paths_fn(*args, **kwargs)
+            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            sig = file_signature(paths)
+            with _lock:
+                entry = _entries.get(key)
+                if entry is not None and entry[0] == sig:
+                    _stats["hits"] += 1
+                    _entries.move_to_end(key)
+                    return entry[1] if shared else copy.deepcopy(entry[1])
+                if entry is not None:
+                    _drop(key)
+                _stats["misses"] += 1
+            value = func(*args, **kwargs)
+            with _lock:
+                _entries[key] = (sig, value, frozenset(os.path.abspath(p) for p in paths))
+                _entries.move_to_end(key)
+                _sizes[key] = _size(value)
+                _evict()
+            return value if shared else copy.deepcopy(value)
+        return wrapper
+    return decorator
+
+def invalidate(path=None):
+    with _lock:
+        if path is None:
+            dropped = len(_entries)
+            _entries.clear()
+            _sizes.clear()
+        else:
+            target = os.path.abspath(path)
+            keys = [k for k, entry in _entries.items() if target in entry[2]]
+            for k in keys:
+                _drop(k)
+            dropped = len(keys)
+        _stats["invalidations"] += dropped
+
+def stats():
+    with _lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {**_stats, "entries": len(_entries), "bytes": sum(_sizes.values()),
+                "hit_ratio": (_stats["hits"] / total) if total else 0.0}
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+
+import cache
+import storage
+
+# --- EXPORTCACHE ---
+# Exports op inhoud geadresseerd: de sleutel is een hash van de geselecteerde dagen, de versie
+# (inhoud) van instellingen, exportconfig en template, en de overige invoer zoals IBAN en
+# beginsaldo. Is er niets gewijzigd, dan komt het bewaarde bestand terug, inclusief de
+# oorspronkelijke volgnummers. Verwijderen gebeurt op basis van laatst gebruikt (LRU),
+# begrensd op aantal en totale grootte.
+
+CACHE_DIR = "export_cache"
+INDEX_FILE = "index.json"
+MAX_ENTRIES = 256
+MAX_BYTES = 64 * 1024 * 1024
+# Verhogen als de exportlogica zelf wijzigt: oude entries worden dan niet meer gevonden
+FORMAT_VERSION = 2
+
+_versions = {}
+
+def file_version(path):
+    # Hash van de bestandsinhoud; enkel opnieuw berekend als het bestand wijzigt
+    sig = cache.file_signature([path])
+    cached = _versions.get(path)
+    if cached and cached[0] == sig:
+        return cached[1]
+    digest = ""
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+    _versions[path] = (sig, digest)
+    return digest
+
+def make_key(kind, selection, *parts):
+    # selection: DayRecords van de geëxporteerde periode
+    h = hashlib.sha256(f"{FORMAT_VERSION}:{kind}:{selection.digest()}".encode())
+    for part in parts:
+        h.update(b"\0" + str(part).encode())
+    return h.hexdigest()
+
+def _index_path(directory):
+    return os.path.join(directory, INDEX_FILE)
+
+def _read_index(directory):
+    path = _index_path(directory)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def _write_index(directory, index):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=1)
+    storage.write_atomic(_index_path(directory), write)
+
+def _remove(directory, index, key):
+    entry = index.pop(key)
+    try:
+        os.remove(os.path.join(directory, entry["bestand"]))
+    except FileNotFoundError:
+        pass
+
+def _evict(directory, index, max_entries, max_bytes):
+    by_age = sorted(index, key=lambda k: index[k]["laatst_gebruikt"])
+    total = sum(e["grootte"] for e in index.values())
+    for key in by_age:
+        if len(index) <= max_entries and total <= max_bytes:
+            break
+        total -= index[key]["grootte"]
+        _remove(directory, index, key)
+
+def get(directory, key):
+    if not os.path.isdir(directory):
+        return None
+    with storage.file_lock(_index_path(directory)):
+        index = _read_index(directory)
+        entry = index.get(key)
+        if entry is None:
+            return None
+        path = os.path.join(directory, entry["bestand"])
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            index.pop(key)
+            _write_index(directory, index)
+            return None
+        entry["laatst_gebruikt"] = time.time()
+        entry["treffers"] = entry.get("treffers", 0) + 1
+        _write_index(directory, index)
+    value = data.decode("utf-8") if entry["soort"] == "tekst" else pickle.loads(data)
+    return value, entry
+
+def put(directory, key, value, meta=None, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+    if isinstance(value, str):
+        soort, data, suffix = "tekst", value.encode("utf-8"), ".txt"
+    else:
+        soort, data, suffix = "pickle", pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ".pkl"
+    if len(data) > max_bytes:
+        return
+    os.makedirs(directory, exist_ok=True)
+    filename = key + suffix
+
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            f.write(data)
+    storage.write_atomic(os.path.join(directory, filename), write)
+    with storage.file_lock(_index_path(directory)):
+        index = _read_index(directory)
+        now = time.time()
+        index[key] = {**(meta or {}), "bestand": filename, "soort": soort, "grootte": len(data),
+                      "aangemaakt": now, "laatst_gebruikt": now, "treffers": 0}
+        _evict(directory, index, max_entries, max_bytes)
+        _write_index(directory, index)
+
+def stats(directory):
+    index = _read_index(directory) if os.path.isdir(directory) else {}
+    return {"entries": len(index), "bytes": sum(e["grootte"] for e in index.values()),
+            "treffers": sum(e.get("treffers", 0) for e in index.values())}
+
+def clear(directory):
+    if not os.path.isdir(directory):
+        return 0
+    with storage.file_lock(_index_path(directory)):
+        index = _read_index(directory)
+        count = len(index)
+        for key in list(index):
+            _remove(directory, index, key)
+        _write_index(directory, index)
+    return count
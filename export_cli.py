@@ -0,0 +1,177 @@
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+# Exports zonder Streamlit, bv. maandelijks via cron:
+#   python export_cli.py --maand 2025-01 --alle-kassas --doel exports/
+# pandas/jinja2 (via kassa_core) worden pas geladen wanneer er effectief geëxporteerd wordt.
+
+FORMATS = ("csv", "xml", "html")
+
+def month_period(maand):
+    start = date.fromisoformat(f"{maand}-01")
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+def previous_month():
+    last = date.today().replace(day=1) - timedelta(days=1)
+    return last.replace(day=1), last
+
+# --- ARGUMENTEN ---
+# Gevalideerd door argparse (type=), zodat foute invoer een korte melding geeft en geen taak start
+
+def month_arg(value):
+    if not re.fullmatch(r"\d{4}-\d{2}", value):
+        raise argparse.ArgumentTypeError(f"ongeldige maand {value!r}, verwacht YYYY-MM")
+    try:
+        month_period(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ongeldige maand {value!r}, verwacht YYYY-MM")
+    return value
+
+def date_arg(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ongeldige datum {value!r}, verwacht YYYY-MM-DD")
+
+def split_arg(value):
+    if value == "month":
+        return value
+    if not value.isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError(f"ongeldige split {value!r}: 'month' of een positief aantal statements")
+    return int(value)
+
+def positive_int(value):
+    if not value.isdigit() or int(value) < 1:
+        raise argparse.ArgumentTypeError(f"verwacht een positief getal, niet {value!r}")
+    return int(value)
+
+def parse_period(args):
+    if args.maand:
+        return month_period(args.maand)
+    if args.van or args.tot:
+        if not (args.van and args.tot):
+            raise ValueError("--van en --tot moeten samen opgegeven worden")
+        if args.van > args.tot:
+            raise ValueError("--van ligt na --tot")
+        return args.van, args.tot
+    return previous_month()
+
+def run_export(task):
+    kassa, formaat, start, end, doel, split = task
+    import kassa_core
+
+    started = time.perf_counter()
+    # Kassanaam eerst valideren: hij wordt ook een map onder doel
+    kassa_core.kassa_file(kassa_core.DATA_FILE, kassa)
+    target_dir = os.path.join(doel, kassa or "standaard")
+    os.makedirs(target_dir, exist_ok=True)
+    ok = True
+    if formaat == "csv":
+        df = kassa_core.generate_csv_export(start, end, kassa)
+        files = []
+        if df is not None and not df.empty:
+            path = os.path.join(target_dir, f"Yuki_{kassa or 'standaard'}_{start}_{end}.csv")
+            kassa_core.write_csv_export(df, path)
+            files.append(path)
+    elif formaat == "html":
+        html, filename = kassa_core.generate_bankafschrift(start, end, kassa)
+        path = os.path.join(target_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+        files = [path]
+    else:
+        files = kassa_core.stream_xml_export(start, end, target_dir, split, kassa)
+        ok = files is not None
+        files = files or []
+    return {"kassa": kassa, "formaat": formaat, "ok": ok, "files": files,
+            "seconden": time.perf_counter() - started}
+
+def failed_result(task, error, seconds):
+    kassa, formaat = task[0], task[1]
+    return {"kassa": kassa, "formaat": formaat, "ok": False, "files": [],
+            "seconden": seconds, "fout": f"{type(error).__name__}: {error}"}
+
+def run_task(task):
+    # Eén mislukte taak stopt de andere niet; de tijd is die van de taak zelf, ook in een worker
+    started = time.perf_counter()
+    try:
+        return run_export(task)
+    except Exception as e:
+        return failed_result(task, e, time.perf_counter() - started)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Yuki CSV- en CAMT.053-exports zonder Streamlit")
+    parser.add_argument("--maand", type=month_arg, help="Volledige maand, bv. 2025-01 (standaard: vorige maand)")
+    parser.add_argument("--van", type=date_arg, help="Begindatum (YYYY-MM-DD)")
+    parser.add_argument("--tot", type=date_arg, help="Einddatum (YYYY-MM-DD), inclusief")
+    parser.add_argument("--kassa", action="append", default=[],
+                        help="Kassa om te exporteren (herhaalbaar); 'standaard' = bestanden in de werkmap")
+    parser.add_argument("--alle-kassas", action="store_true", help="Standaardkassa plus alle kassas/<naam>/")
+    parser.add_argument("--formaat", action="append", choices=FORMATS, help="csv, xml en/of html-bankafschrift (standaard: csv en xml)")
+    parser.add_argument("--split", type=split_arg, help="CAMT.053 opsplitsen per 'month' of per N statements")
+    parser.add_argument("--doel", default="exports", help="Doelmap (per kassa een submap)")
+    parser.add_argument("--werkmap", help="Map met de kassabestanden (standaard: huidige map)")
+    parser.add_argument("--workers", type=positive_int, default=os.cpu_count() or 1, help="Aantal processen")
+    args = parser.parse_args(argv)
+
+    try:
+        start, end = parse_period(args)
+    except ValueError as e:
+        parser.error(str(e))
+    split = args.split
+    formats = args.formaat or ["csv", "xml"]
+    doel = os.path.abspath(args.doel)
+    if args.werkmap:
+        os.chdir(args.werkmap)
+
+    kassas = [None if k == "standaard" else k for k in args.kassa]
+    if any(kassas):
+        from kassa_core import KASSA_NAME_PATTERN
+        for kassa in filter(None, kassas):
+            if not KASSA_NAME_PATTERN.match(kassa):
+                parser.error(f"ongeldige kassanaam {kassa!r}: enkel letters, cijfers, - en _")
+    if args.alle_kassas:
+        import kassa_core
+        kassas = [None] + kassa_core.list_kassas()
+    if not kassas:
+        kassas = [None]
+
+    tasks = [(kassa, formaat, start, end, doel, split) for kassa in kassas for formaat in formats]
+    print(f"Export {start} t/m {end}: {len(kassas)} kassa('s), {len(tasks)} taken, {args.workers} workers", flush=True)
+
+    started = time.perf_counter()
+    results = []
+
+    def report(result):
+        results.append(result)
+        status = "OK  " if result["ok"] else "FOUT"
+        files = result.get("fout") or ", ".join(os.path.relpath(f, doel) for f in result["files"]) or "geen gegevens"
+        print(f"[{len(results)}/{len(tasks)}] {status} {result['kassa'] or 'standaard':<16} "
+              f"{result['formaat']:<4} {result['seconden']:7.2f}s  {files}", flush=True)
+
+    if args.workers <= 1 or len(tasks) == 1:
+        for task in tasks:
+            report(run_task(task))
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(tasks))) as pool:
+            futures = {pool.submit(run_task, task): task for task in tasks}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Fout van de pool zelf (bv. een afgebroken worker): geen eigen taaktijd
+                    result = failed_result(futures[future], e, 0.0)
+                report(result)
+
+    failed = sum(1 for r in results if not r["ok"])
+    print(f"Klaar in {time.perf_counter() - started:.2f}s — {len(results) - failed} gelukt, {failed} mislukt", flush=True)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import storage
+import kassa_core
+
+# --- EXPORTJOBS ---
+# Exports draaien op een gedeelde threadpool van het proces, los van de Streamlit-rerun die ze
+# aanvroeg: de sessie blijft bruikbaar en meerdere gebruikers kunnen tegelijk jobs in de wachtrij
+# zetten. Elke job heeft een id, voortgang en kan geannuleerd worden (tussen twee stukken van de
+# export). Status en resultaat worden in JOBS_DIR bewaard, zodat een afgewerkte export later,
+# ook na een herstart, nog te downloaden is.
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = "export_jobs"
+MAX_WORKERS = 2
+KEEP_DAYS = 14
+FORMATS = {"csv": "Yuki CSV", "xml": "CAMT.053", "html": "Bankafschrift"}
+
+WAITING = "wachtend"
+RUNNING = "bezig"
+DONE = "klaar"
+CANCELLED = "geannuleerd"
+FAILED = "mislukt"
+FINISHED = (DONE, CANCELLED, FAILED)
+
+_lock = threading.Lock()
+_jobs = {}
+_cancel_flags = {}
+_futures = {}
+_pool = None
+_loaded = False
+
+def _meta_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+def _result_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.out")
+
+def _persist(job):
+    os.makedirs(JOBS_DIR, exist_ok=True)
+
+    def write(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+    storage.write_atomic(_meta_path(job["id"]), write)
+
+def _load():
+    # Eenmalig per proces: jobs van vorige runs inlezen; wat toen nog liep is onderbroken
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    if not os.path.isdir(JOBS_DIR):
+        return
+    for name in os.listdir(JOBS_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(JOBS_DIR, name), "r", encoding="utf-8") as f:
+                job = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if job.get("status") not in FINISHED:
+            job.update(status=FAILED, fout="Onderbroken door herstart", klaar_op=job.get("gestart_op"))
+            _persist(job)
+        _jobs[job["id"]] = job
+
+def _executor():
+    global _pool
+    if _pool is None:
+        _pool = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="export")
+    return _pool
+
+def _update(job_id, persist=True, **changes):
+    with _lock:
+        job = _jobs[job_id]
+        job.update(changes)
+        snapshot = dict(job)
+    if persist:
+        _persist(snapshot)
+
+def _export(job, progress):
+    # Levert (inhoud, bestandsnaam); None als er niets te exporteren valt
+    kassa, start, end = job["kassa"], job["van"], job["tot"]
+    if job["formaat"] == "csv":
+        df = kassa_core.generate_csv_export(start, end, kassa, progress=progress)
+        if df is None or df.empty:
+            return None
+        return df.to_csv(index=False, sep=";"), f"Yuki_{kassa or 'standaard'}_{start}_{end}.csv"
+    if job["formaat"] == "html":
+        return kassa_core.generate_bankafschrift(start, end, kassa, progress=progress)
+    # generate_xml_export geeft (None, None) bij een lege periode én bij een templatefout:
+    # een lege periode hier al afhandelen, zodat None daarna enkel nog een fout betekent
+    if not len(kassa_core.load_records(start, end, kassa)):
+        return None
+    xml, filename = kassa_core.generate_xml_export(start, end, kassa, progress=progress)
+    if xml is None:
+        raise RuntimeError("CAMT.053-export mislukt, zie log")
+    return xml, filename
+
+def _now():
+    return datetime.now().isoformat(timespec="milliseconds")
+
+def _finish(job_id, status, **changes):
+    _update(job_id, status=status, klaar_op=_now(), **changes)
+    _cancel_flags.pop(job_id, None)
+    _futures.pop(job_id, None)
+
+def _write_result(job_id, data):
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            f.write(data)
+    storage.write_atomic(_result_path(job_id), write)
+
+def _run(job_id):
+    cancel = _cancel_flags[job_id]
+    if cancel.is_set():
+        _finish(job_id, CANCELLED)
+        return
+    _update(job_id, status=RUNNING, gestart_op=_now())
+    started = time.perf_counter()
+
+    def progress(done, total):
+        if cancel.is_set():
+            raise kassa_core.ExportCancelled()
+        # Enkel in het geheugen: de UI leest de voortgang via get()/jobs()
+        _update(job_id, persist=False, voortgang=done / total if total else 0.0)
+
+    with _lock:
+        job = dict(_jobs[job_id])
+    try:
+        result = _export(job, progress)
+        if cancel.is_set():
+            raise kassa_core.ExportCancelled()
+    except kassa_core.ExportCancelled:
+        _finish(job_id, CANCELLED)
+        return
+    except Exception as e:
+        logger.exception("Exportjob %s mislukt", job_id)
+        _finish(job_id, FAILED, fout=str(e) or type(e).__name__)
+        return
+
+    changes = {"voortgang": 1.0, "seconden": round(time.perf_counter() - started, 3)}
+    if result is None:
+        changes["bericht"] = "Geen dagen in deze periode"
+    else:
+        content, filename = result
+        data = content.encode("utf-8")
+        _write_result(job_id, data)
+        changes.update(bestand=filename, grootte=len(data))
+    _finish(job_id, DONE, **changes)
+
+def submit(formaat, start, end, kassa=None, aangevraagd_door=None):
+    if formaat not in FORMATS:
+        raise ValueError(f"Onbekend exportformaat: {formaat}")
+    cleanup()
+    job_id = uuid.uuid4().hex[:12]
+    job = {"id": job_id, "formaat": formaat, "kassa": kassa, "van": str(start), "tot": str(end),
+           "status": WAITING, "voortgang": 0.0, "aangemaakt_op": _now(),
+           "gestart_op": None, "klaar_op": None, "aangevraagd_door": aangevraagd_door,
+           "bestand": None, "grootte": 0, "fout": None, "bericht": None}
+    with _lock:
+        _jobs[job_id] = job
+        _cancel_flags[job_id] = threading.Event()
+    _persist(job)
+    future = _executor().submit(_run, job_id)
+    with _lock:
+        # Een heel korte job kan al afgewerkt zijn
+        if _jobs[job_id]["status"] not in FINISHED:
+            _futures[job_id] = future
+    return job_id
+
+def get(job_id):
+    with _lock:
+        _load()
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+def jobs(kassa=None, all_kassas=False):
+    with _lock:
+        _load()
+        rows = [dict(j) for j in _jobs.values() if all_kassas or j["kassa"] == kassa]
+    return sorted(rows, key=lambda j: j["aangemaakt_op"], reverse=True)
+
+def cancel(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return False
+        flag = _cancel_flags.get(job_id)
+    if flag is not None:
+        flag.set()
+    future = _futures.get(job_id)
+    if future is not None and future.cancel():
+        # Nog niet gestart: meteen afgehandeld
+        _finish(job_id, CANCELLED)
+    return True
+
+def read_result(job_id):
+    job = get(job_id)
+    if job is None or job["status"] != DONE or not job.get("bestand"):
+        return None
+    try:
+        with open(_result_path(job_id), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def remove(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None or job["status"] not in FINISHED:
+            return False
+        del _jobs[job_id]
+    for path in (_meta_path(job_id), _result_path(job_id)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return True
+
+def cleanup(keep_days=KEEP_DAYS):
+    # Afgewerkte jobs ouder dan keep_days verwijderen, inclusief hun resultaat
+    limit = (datetime.now() - timedelta(days=keep_days)).isoformat(timespec="seconds")
+    return sum(remove(job["id"]) for job in jobs(all_kassas=True)
+               if job["status"] in FINISHED and job["aangemaakt_op"] < limit)
@@ -0,0 +1,156 @@
+import collections
+import cProfile
+import functools
+import io
+import itertools
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# --- INSTRUMENTATIE ---
+# Tijdsmetingen (spans) rond loaders, saves en exports. Een span telt altijd mee in de
+# totalen per naam over het hele proces; loopt er op de huidige thread een run (één
+# Streamlit-rerun), dan wordt hij ook daar bewaard. Per run kan optioneel cProfile mee.
+
+MAX_RUNS = 200
+PROFILE_LINES = 30
+
+_local = threading.local()
+_lock = threading.Lock()
+_runs = collections.deque(maxlen=MAX_RUNS)
+_totals = {}
+_run_ids = itertools.count(1)
+
+class Run:
+    def __init__(self, label, profile=False):
+        self.id = next(_run_ids)
+        self.label = label
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.last_activity = self.started
+        self.spans = []
+        self.total_ms = None
+        self.interrupted = False
+        self.profile_text = None
+        self._profiler = None
+        if profile:
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError:
+                # Er loopt al een andere profiler op deze thread
+                self._profiler = None
+
+    def to_dict(self):
+        return {"run": self.id, "label": self.label, "start": self.started_at.isoformat(timespec="milliseconds"),
+                "totaal_ms": self.total_ms, "onderbroken": self.interrupted,
+                "spans": list(self.spans), "profiel": self.profile_text}
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+def current_run():
+    return getattr(_local, "run", None)
+
+def _record(name, duration, parent, depth, error):
+    ms = duration * 1000
+    with _lock:
+        total = _totals.setdefault(name, {"naam": name, "aantal": 0, "totaal_ms": 0.0, "max_ms": 0.0, "fouten": 0})
+        total["aantal"] += 1
+        total["totaal_ms"] += ms
+        total["max_ms"] = max(total["max_ms"], ms)
+        total["fouten"] += bool(error)
+    run = current_run()
+    if run is not None:
+        run.spans.append({"naam": name, "ms": round(ms, 3), "ouder": parent, "diepte": depth, "fout": error})
+        run.last_activity = time.perf_counter()
+
+@contextmanager
+def span(name):
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        # Ook st.rerun()/st.stop() komen hier als exception voorbij
+        error = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        _record(name, time.perf_counter() - started, parent, len(stack), error)
+
+def timed(name=None):
+    def decorator(func):
+        label = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def begin_run(label, profile=False):
+    run = Run(label, profile)
+    _local.run = run
+    _local.stack = []
+    return run
+
+def end_run(run=None, interrupted=False):
+    run = run or current_run()
+    if run is None or run.total_ms is not None:
+        return run
+    end = run.last_activity if interrupted else time.perf_counter()
+    run.total_ms = round((end - run.started) * 1000, 3)
+    run.interrupted = interrupted
+    if run._profiler is not None:
+        try:
+            run._profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(run._profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            run.profile_text = out.getvalue()
+        except ValueError:
+            pass
+        run._profiler = None
+    if current_run() is run:
+        _local.run = None
+    with _lock:
+        _runs.append(run)
+    return run
+
+def runs():
+    with _lock:
+        return list(_runs)
+
+def summary():
+    with _lock:
+        rows = [dict(t) for t in _totals.values()]
+    for row in rows:
+        row["gemiddeld_ms"] = row["totaal_ms"] / row["aantal"] if row["aantal"] else 0.0
+    return sorted(rows, key=lambda r: r["totaal_ms"], reverse=True)
+
+def run_totals(run):
+    # Tijd per stap op het hoogste niveau van een run (geneste spans tellen al mee in hun ouder)
+    totals = collections.Counter()
+    for s in run.spans:
+        if s["diepte"] == 0:
+            totals[s["naam"]] += s["ms"]
+    return dict(totals.most_common())
+
+def export_jsonl(include_summary=True):
+    lines = [json.dumps(run.to_dict(), ensure_ascii=False) for run in runs()]
+    if include_summary:
+        lines += [json.dumps({"totaal": row}, ensure_ascii=False) for row in summary()]
+    return "\n".join(lines) + ("\n" if lines else "")
+
+def reset():
+    with _lock:
+        _runs.clear()
+        _totals.clear()
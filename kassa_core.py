@@ -0,0 +1,810 @@
+import pandas as pd
+import numpy as np
+from datetime import datetime
+import os
+import json
+import re
+import random
+import itertools
+import concurrent.futures
+import inspect
+from contextlib import contextmanager
+import logging
+import storage
+import templating
+import saldo_index
+import aggregates
+import records
+import export_cache
+import cache
+import instrumentation
+
+# Gedeelde logica zonder Streamlit: gebruikt door app.py en de export-CLI
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURATIE ---
+DATA_FILE = "kassa_historiek.csv"
+SETTINGS_FILE = "kassa_settings.csv"
+EXPORT_CONFIG_FILE = "export_config.csv"
+CONFIG_FILE = "kassa_config.json"
+SALDO_INDEX_FILE = "kassa_saldo_index.db"
+AGGREGATES_FILE = "kassa_aggregaten.db"
+KASSA_DIR = "kassas"
+KASSA_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]*$")
+
+# --- FUNCTIES ---
+
+def generate_valid_belgian_iban():
+    protocol = "999"
+    random_part = "".join([str(random.randint(0, 9)) for _ in range(7)])
+    base_num = int(protocol + random_part)
+    remainder = base_num % 97
+    check_digits = 97 if remainder == 0 else remainder
+    bban = f"{protocol}{random_part}{check_digits:02d}"
+    country_code_num = "111400"
+    iban_check_base = int(bban + country_code_num)
+    iban_remainder = iban_check_base % 97
+    iban_check = 98 - iban_remainder
+    return f"BE{iban_check:02d}{bban}"
+
+# --- KASSA'S ---
+# Zonder kassa worden de bestanden in de werkmap gebruikt (één winkel, zoals voorheen);
+# elke extra kassa krijgt een eigen map kassas/<naam>/ met dezelfde bestandsnamen.
+
+def kassa_file(filename, kassa=None):
+    if not kassa:
+        return filename
+    if not KASSA_NAME_PATTERN.match(kassa):
+        raise ValueError(f"Ongeldige kassanaam: {kassa}")
+    return os.path.join(KASSA_DIR, kassa, filename)
+
+def list_kassas():
+    if not os.path.isdir(KASSA_DIR):
+        return []
+    return sorted(d for d in os.listdir(KASSA_DIR)
+                  if os.path.isdir(os.path.join(KASSA_DIR, d)) and KASSA_NAME_PATTERN.match(d))
+
+def create_kassa(kassa):
+    os.makedirs(os.path.dirname(kassa_file(CONFIG_FILE, kassa)), exist_ok=True)
+
+def _write_json(path, data):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+    storage.write_atomic(path, write)
+
+def _write_csv(path, df):
+    storage.write_atomic(path, lambda tmp: df.to_csv(tmp, index=False))
+
+@instrumentation.timed()
+@cache.file_cached(lambda kassa=None: [kassa_file(CONFIG_FILE, kassa)])
+def load_config(kassa=None):
+    default_config = {
+        "start_saldo": 0.0,
+        "iban": "",
+        "coda_seq": 0,
+        "opslag": "csv",
+        "bedrijfsnaam": "",
+        "logo_pad": "",
+        "laatste_update": str(datetime.now().date())
+    }
+    config_file = kassa_file(CONFIG_FILE, kassa)
+    if os.path.exists(config_file):
+        with open(config_file, "r") as f:
+            data = json.load(f)
+            for key, value in default_config.items():
+                if key not in data:
+                    data[key] = value
+            return data
+    return default_config
+
+@instrumentation.timed()
+def save_config(config_data, kassa=None):
+    config_file = kassa_file(CONFIG_FILE, kassa)
+    with storage.file_lock(config_file):
+        data = dict(config_data)
+        if os.path.exists(config_file):
+            # coda_seq wordt enkel via allocate_coda_seq verhoogd: een verouderde kopie mag hem niet terugzetten
+            with open(config_file, "r") as f:
+                data["coda_seq"] = json.load(f).get("coda_seq", data.get("coda_seq", 0))
+        _write_json(config_file, data)
+    cache.invalidate(config_file)
+
+@instrumentation.timed()
+def allocate_coda_seq(count, kassa=None):
+    # Reserveert atomair `count` volgnummers en geeft het laatst uitgegeven nummer vóór deze reeks terug
+    config_file = kassa_file(CONFIG_FILE, kassa)
+    with storage.file_lock(config_file):
+        data = inspect.unwrap(load_config)(kassa)
+        start = int(data.get("coda_seq", 0))
+        data["coda_seq"] = start + count
+        _write_json(config_file, data)
+    cache.invalidate(config_file)
+    return start
+
+def get_default_settings():
+    return [
+        {"Code": "Omzet_21",   "Label": "Omzet 21%",       "Rekening": "700021", "ExportDesc": "Omzet 21% (&notitie&) GL-700021", "BtwCode": "V21", "Type": "Credit"},
+        {"Code": "Omzet_12",   "Label": "Omzet 12%",       "Rekening": "700012", "ExportDesc": "Omzet 12% (&notitie&) GL-700012", "BtwCode": "V12", "Type": "Credit"},
+        {"Code": "Omzet_6",    "Label": "Omzet 6%",        "Rekening": "700006", "ExportDesc": "Omzet 6% (&notitie&) GL-700006",  "BtwCode": "V6",  "Type": "Credit"},
+        {"Code": "Omzet_0",    "Label": "Omzet 0%",        "Rekening": "700000", "ExportDesc": "Omzet 0% (&notitie&) GL-700000",  "BtwCode": "V0",  "Type": "Credit"},
+        {"Code": "Cash",       "Label": "Kas (Cash)",      "Rekening": "570000", "ExportDesc": "Ontvangst Cash GL-570000",        "BtwCode": "",    "Type": "Debet"},
+        {"Code": "Bancontact", "Label": "Bancontact",      "Rekening": "580000", "ExportDesc": "Bancontact &datum& GL-580000",     "BtwCode": "",    "Type": "Debet"},
+        {"Code": "Payconiq",   "Label": "Payconiq",        "Rekening": "580000", "ExportDesc": "Payconiq &datum& GL-580000",       "BtwCode": "",    "Type": "Debet"},
+        {"Code": "Oversch",    "Label": "Overschrijving",  "Rekening": "580000", "ExportDesc": "Overschrijving &datum& GL-580000","BtwCode": "",    "Type": "Debet"},
+        {"Code": "Bonnen",     "Label": "Cadeaubonnen",    "Rekening": "440000", "ExportDesc": "Cadeaubon &datum& GL-440000",      "BtwCode": "",    "Type": "Debet"},
+        {"Code": "Afstorting", "Label": "Afstorting Bank", "Rekening": "550000", "ExportDesc": "Afstorting &datum& GL-550000",     "BtwCode": "",    "Type": "Credit"},
+    ]
+
+@instrumentation.timed()
+@cache.file_cached(lambda kassa=None: [kassa_file(SETTINGS_FILE, kassa)])
+def load_settings(kassa=None):
+    settings_file = kassa_file(SETTINGS_FILE, kassa)
+    if os.path.exists(settings_file):
+        df = pd.read_csv(settings_file, dtype={"Rekening": str, "BtwCode": str})
+        defaults = pd.DataFrame(get_default_settings())
+        for code in defaults["Code"]:
+            if code not in df["Code"].values:
+                row = defaults[defaults["Code"] == code].iloc[0]
+                df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+        return df
+    else:
+        df = pd.DataFrame(get_default_settings())
+        df["Rekening"] = df["Rekening"].astype(str)
+        _write_csv(settings_file, df)
+        return df
+
+@instrumentation.timed()
+def save_settings(df_settings, kassa=None):
+    settings_file = kassa_file(SETTINGS_FILE, kassa)
+    _write_csv(settings_file, df_settings)
+    cache.invalidate(settings_file)
+
+def get_yuki_mapping(kassa=None):
+    df = load_settings(kassa)
+    mapping = {}
+    for _, row in df.iterrows():
+        mapping[row['Code']] = {
+            'Rekening': row['Rekening'],
+            'Label': row['Label'],
+            'Template': row.get('ExportDesc', row['Label'])
+        }
+    return mapping
+
+# --- CATEGORIEËN ---
+# Eén schema per kassa, afgeleid van de codes in kassa_settings.csv: per code de kolom in de
+# historiek, de BTW-code, de soort (omzet/betaling/afstorting) en het teken. Een extra
+# betaalwijze is een nieuwe rij in de instellingen, met in "Kolom" de historiekkolom waarop
+# ze boekt (bv. Visa -> Geld_Bancontact). Het schema wordt pas opnieuw opgebouwd als het
+# instellingenbestand wijzigt.
+# Beperking: de historiek bewaart enkel het bedrag per kolom. De exports (CSV_EXPORT_LINES,
+# STATEMENT_DEBITS) boeken die kolom met de rekening en omschrijving van de standaardcode
+# (CODE_COLUMNS); Rekening/ExportDesc van een extra betaalwijze worden niet gebruikt.
+
+CODE_COLUMNS = {"Cash": "Geld_Cash", "Bancontact": "Geld_Bancontact", "Payconiq": "Geld_Payconiq",
+                "Oversch": "Geld_Overschrijving", "Bonnen": "Geld_Bonnen", "Afstorting": "Geld_Afstorting"}
+# Labels zoals ze in het invoerscherm staan
+INVOER_LABELS = {"Omzet_0": "0% (Vrijgesteld)", "Omzet_6": "6% (Voeding)", "Omzet_12": "12% (Horeca)",
+                 "Omzet_21": "21% (Algemeen)", "Oversch": "Overschrijving", "Bonnen": "Cadeaubonnen",
+                 "Cash": "Cash"}
+# Herkenning van vrije labels zoals voorheen (eerste treffer wint), voor labels die niet in het schema staan
+LEGACY_LABEL_RULES = [("0%", "Omzet_0"), ("6%", "Omzet_6"), ("12%", "Omzet_12"), ("21%", "Omzet_21"),
+                      ("Bancontact", "Geld_Bancontact"), ("Cash", "Geld_Cash"), ("Payconiq", "Geld_Payconiq"),
+                      ("Overschrijving", "Geld_Overschrijving"), ("Bonnen", "Geld_Bonnen"),
+                      ("Afstorting", "Geld_Afstorting")]
+SOORT_ORDER = {"omzet": 0, "betaling": 1, "afstorting": 2}
+
+def _text(value, default=""):
+    return value.strip() if isinstance(value, str) and value.strip() else default
+
+@cache.file_cached(lambda kassa=None: [kassa_file(SETTINGS_FILE, kassa)])
+def category_schema(kassa=None):
+    rows = []
+    for _, row in load_settings(kassa).iterrows():
+        code = row["Code"]
+        kolom = _text(row.get("Kolom"), CODE_COLUMNS.get(code, code))
+        if kolom not in storage.AMOUNT_COLUMNS:
+            logger.warning("Code %s: onbekende historiekkolom %s, wordt genegeerd", code, kolom)
+            continue
+        if kolom.startswith("Omzet_"):
+            soort, teken = "omzet", 1
+        else:
+            teken = -1 if _text(row.get("Type")) == "Credit" else 1
+            soort = "afstorting" if teken < 0 else "betaling"
+        standaard = next((c for c, k in CODE_COLUMNS.items() if k == kolom), kolom)
+        if code != standaard:
+            logger.info("Code %s boekt op %s; in de exports staat dat bedrag onder %s", code, kolom, standaard)
+        label = _text(row.get("Label"), code)
+        rows.append({"Code": code, "Kolom": kolom, "Btw": _text(row.get("BtwCode")), "Soort": soort,
+                     "Teken": teken, "Label": label, "Invoer": INVOER_LABELS.get(code, label)})
+    schema = pd.DataFrame(rows, columns=["Code", "Kolom", "Btw", "Soort", "Teken", "Label", "Invoer"])
+    # Omzet oplopend per tarief, daarna betalingen en afstortingen in de volgorde van de instellingen
+    rate = schema["Kolom"].str.extract(r"Omzet_(\d+)", expand=False).astype(float)
+    order = schema["Soort"].map(SOORT_ORDER) * 1000 + rate.fillna(0)
+    return schema.iloc[order.argsort(kind="stable")].set_index("Code")
+
+@cache.file_cached(lambda kassa=None: [kassa_file(SETTINGS_FILE, kassa)])
+def compiled_categories(kassa=None):
+    # Platte versie van het schema voor het invoerpad: label -> kolomnummer, en per kolom de soort
+    schema = category_schema(kassa)
+    columns = list(dict.fromkeys(schema["Kolom"]))
+    position = {col: i for i, col in enumerate(columns)}
+    lookup = {}
+    for code, cat in schema.iterrows():
+        for key in (cat["Kolom"], code, cat["Label"], cat["Invoer"]):
+            lookup.setdefault(key, position[cat["Kolom"]])
+    soort = dict(zip(schema["Kolom"], schema["Soort"]))
+    return {"columns": columns, "lookup": lookup,
+            "legacy": [(needle, position[col]) for needle, col in LEGACY_LABEL_RULES if col in position],
+            "soort": [soort[col] for col in columns]}
+
+def resolve_columns(labels, compiled):
+    # Kolomnummer per label (-1 = niet herkend); elk uniek label wordt één keer opgezocht
+    resolved = {}
+    for label in set(labels):
+        pos = compiled["lookup"].get(label)
+        if pos is None:
+            pos = next((p for needle, p in compiled["legacy"] if isinstance(label, str) and needle in label), -1)
+        resolved[label] = pos
+    return np.fromiter((resolved[label] for label in labels), dtype=np.int64, count=len(labels))
+
+def summarize_input(df_input, kassa=None):
+    # Bedragen per historiekkolom plus de dagtotalen, in één gevectoriseerde doorgang.
+    # Gerekend in centen: het verschil is exact nul als omzet en betalingen overeenkomen.
+    compiled = compiled_categories(kassa)
+    columns = compiled["columns"]
+    per_column = np.zeros(len(columns), dtype=np.int64)
+    if df_input is not None and len(df_input):
+        pos = resolve_columns(df_input["Label"].tolist(), compiled)
+        bedrag = records.to_cents_array(df_input["Bedrag"].to_numpy())
+        valid = (pos >= 0) & (bedrag > 0)
+        np.add.at(per_column, pos[valid], bedrag[valid])
+    soort = np.array(compiled["soort"], dtype=object)
+    omzet, betalingen, afstorting = (int(per_column[soort == s].sum()) for s in ("omzet", "betaling", "afstorting"))
+    kolommen = dict(zip(columns, (per_column / 100).tolist()))
+    return {
+        "kolommen": kolommen,
+        "som_omzet": omzet / 100,
+        "som_geld": (betalingen - afstorting) / 100,
+        "verschil": (omzet - betalingen) / 100,
+        "cash_in": kolommen.get("Geld_Cash", 0.0),
+        "cash_out": afstorting / 100,
+    }
+
+def get_default_export_config():
+    return pd.DataFrame([
+        {"Kolom": "Grootboekrekening kas", "Bron": "Vast", "Waarde": "570000"},
+        {"Kolom": "Kas omschrijving",      "Bron": "Vast", "Waarde": "Dagontvangsten"},
+        {"Kolom": "Transactie code",       "Bron": "Vast", "Waarde": ""},
+        {"Kolom": "Tegenrekening",         "Bron": "Veld", "Waarde": "Grootboekrekening"},
+        {"Kolom": "Naam tegenrekening",    "Bron": "Veld", "Waarde": "Label"},
+        {"Kolom": "Datum transactie",      "Bron": "Veld", "Waarde": "Datum"},
+        {"Kolom": "Omschrijving",          "Bron": "Veld", "Waarde": "Omschrijving"},
+        {"Kolom": "Bedrag",                "Bron": "Veld", "Waarde": "Bedrag"},
+        {"Kolom": "Saldo kas",             "Bron": "Vast", "Waarde": ""},
+        {"Kolom": "Projectcode",           "Bron": "Vast", "Waarde": ""},
+        {"Kolom": "Projectnaam",           "Bron": "Vast", "Waarde": ""},
+    ])
+
+@instrumentation.timed()
+@cache.file_cached(lambda kassa=None: [kassa_file(EXPORT_CONFIG_FILE, kassa)])
+def load_export_config(kassa=None):
+    export_config_file = kassa_file(EXPORT_CONFIG_FILE, kassa)
+    if os.path.exists(export_config_file):
+        return pd.read_csv(export_config_file)
+    else:
+        df = get_default_export_config()
+        _write_csv(export_config_file, df)
+        return df
+
+@instrumentation.timed()
+def save_export_config(df, kassa=None):
+    export_config_file = kassa_file(EXPORT_CONFIG_FILE, kassa)
+    _write_csv(export_config_file, df)
+    cache.invalidate(export_config_file)
+
+def history_backend(kassa=None):
+    return storage.get_backend(load_config(kassa).get("opslag", "csv"), kassa_file(DATA_FILE, kassa))
+
+def history_marker(kassa=None):
+    # Identiteit van de historiekbestanden: wijzigt bij elke schrijfactie, compactie of teruggezette backup
+    return json.dumps(cache.file_signature(history_backend(kassa).files()))
+
+@instrumentation.timed()
+@cache.file_cached(lambda kassa=None: history_backend(kassa).files())
+def load_database(kassa=None):
+    return history_backend(kassa).load_all()
+
+@instrumentation.timed()
+@cache.file_cached(lambda datum_str, kassa=None: history_backend(kassa).files())
+def load_day(datum_str, kassa=None):
+    return history_backend(kassa).load_day(datum_str)
+
+@instrumentation.timed()
+@cache.file_cached(lambda start_str, end_str, kassa=None: history_backend(kassa).files(), shared=True)
+def load_records(start_str, end_str, kassa=None):
+    # Alleen-lezen DayRecords (ordinalen en centen), gedeeld tussen aanroepers zonder kopie
+    return records.DayRecords.from_frame(history_backend(kassa).load_range(start_str, end_str))
+
+@instrumentation.timed()
+def get_data_by_date(datum_obj, kassa=None):
+    return load_day(str(datum_obj), kassa)
+
+@instrumentation.timed()
+def calculate_current_saldo(target_date, kassa=None):
+    config = load_config(kassa)
+    start = saldo_index.to_cents(config.get("start_saldo", 0.0))
+    datum_str = pd.to_datetime(target_date).strftime("%Y-%m-%d")
+    movement = saldo_index.movement_before(kassa_file(SALDO_INDEX_FILE, kassa), datum_str,
+                                           lambda: load_database(kassa), history_marker(kassa))
+    return (start + movement) / 100
+
+@instrumentation.timed()
+def get_period_totals(level="maand", start=None, end=None, kassa=None):
+    return aggregates.totals(kassa_file(AGGREGATES_FILE, kassa), level, start, end, lambda: load_database(kassa),
+                             history_marker(kassa))
+
+@instrumentation.timed()
+def save_transaction(datum, omschrijving, df_input, totaal_omzet, totaal_geld, verschil, kassa=None):
+    datum_str = str(datum)
+
+    if df_input is None:
+        df_input = pd.DataFrame(columns=['Label', 'Bedrag'])
+    if not omschrijving or str(omschrijving).strip() == "":
+        omschrijving = f"Dagontvangsten {pd.to_datetime(datum).strftime('%d-%m-%Y')}"
+
+    new_row = {
+        "Datum": datum_str, "Omschrijving": omschrijving, "Totaal_Omzet": float(totaal_omzet),
+        "Totaal_Geld": float(totaal_geld), "Verschil": float(verschil),
+        "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "Omzet_0": 0.0, "Omzet_6": 0.0, "Omzet_12": 0.0, "Omzet_21": 0.0,
+        "Geld_Bancontact": 0.0, "Geld_Cash": 0.0, "Geld_Payconiq": 0.0,
+        "Geld_Overschrijving": 0.0, "Geld_Bonnen": 0.0, "Geld_Afstorting": 0.0
+    }
+    new_row.update(summarize_input(df_input, kassa)["kolommen"])
+
+    index_file = kassa_file(SALDO_INDEX_FILE, kassa)
+    # Historiek, saldo-index en periodetotalen samen onder één lock, zodat ze in dezelfde volgorde wijzigen.
+    # De backend pas onder de lock bepalen: een migratie (ook onder deze lock) kan net de opslag gewijzigd hebben.
+    with storage.file_lock(index_file):
+        backend = history_backend(kassa)
+        before = history_marker(kassa)
+        backend.upsert(new_row)
+        after = history_marker(kassa)
+        saldo_index.update_day(index_file, datum_str, new_row["Geld_Cash"], new_row["Geld_Afstorting"], before, after)
+        aggregates.update_day(kassa_file(AGGREGATES_FILE, kassa), new_row, before, after)
+    cache.invalidate(backend.path)
+
+def migrate_history(target, kassa=None, source=None):
+    # Historiek kopiëren naar een andere backend en de kassa ernaar laten wijzen, onder dezelfde lock
+    # als save_transaction en de bulkimport: geen save komt nog in de oude backend terecht
+    with storage.file_lock(kassa_file(SALDO_INDEX_FILE, kassa)):
+        config = load_config(kassa)
+        source = source or config.get("opslag", "csv")
+        if source == target:
+            return 0, source
+        count = storage.migrate(kassa_file(DATA_FILE, kassa), source, target)
+        config["opslag"] = target
+        save_config(config, kassa)
+    cache.invalidate()
+    return count, source
+
+# Volgorde van de boekingen per dag: (code in instellingen, kolom, BTW-code, teken). Vast per
+# historiekkolom, zie de beperking bij CATEGORIEËN.
+CSV_EXPORT_LINES = [
+    ("Omzet_21", "Omzet_21", "V21", 1), ("Omzet_12", "Omzet_12", "V12", 1),
+    ("Omzet_6", "Omzet_6", "V6", 1), ("Omzet_0", "Omzet_0", "V0", 1),
+    ("Bancontact", "Geld_Bancontact", "", 1), ("Payconiq", "Geld_Payconiq", "", 1),
+    ("Oversch", "Geld_Overschrijving", "", 1), ("Bonnen", "Geld_Bonnen", "", 1),
+    ("Cash", "Geld_Cash", "", 1), ("Afstorting", "Geld_Afstorting", "", -1),
+]
+
+def render_template_column(template, datum, notitie):
+    # Kolomversie van template.replace("&datum&", datum).replace("&notitie&", notitie)
+    result = None
+    for i, part in enumerate(template.split("&datum&")):
+        if i:
+            result = result + datum
+        for j, piece in enumerate(part.split("&notitie&")):
+            if j:
+                result = result + notitie
+            result = piece if result is None else result + piece
+    if isinstance(result, str):
+        return pd.Series(result, index=datum.index, dtype=object)
+    return result
+
+def format_amounts(values):
+    return pd.Series(np.char.mod("%.2f", values), dtype=object).str.replace(".", ",", regex=False)
+
+@instrumentation.timed()
+def generate_csv_export(start_date, end_date, kassa=None, progress=None):
+    # Gevectoriseerd: voortgang enkel voor en na het opbouwen
+    export_config = load_export_config(kassa)
+    MAPPING = get_yuki_mapping(kassa)
+    selection = load_records(str(start_date), str(end_date), kassa)
+    if not len(selection):
+        return None
+    if progress:
+        progress(0, len(selection))
+
+    cache_dir = kassa_file(export_cache.CACHE_DIR, kassa)
+    cache_key = export_cache.make_key("csv", selection, export_cache.file_version(kassa_file(SETTINGS_FILE, kassa)),
+                                      export_cache.file_version(kassa_file(EXPORT_CONFIG_FILE, kassa)))
+    hit = export_cache.get(cache_dir, cache_key)
+    if hit is not None:
+        return hit[0]
+    export_df = build_csv_export(selection, export_config, MAPPING)
+    export_cache.put(cache_dir, cache_key, export_df, {"export": "csv", "van": str(start_date), "tot": str(end_date)})
+    if progress:
+        progress(len(selection), len(selection))
+    return export_df
+
+def build_csv_export(selection, export_config, MAPPING):
+    # selection: DayRecords; bedragen blijven centen tot bij het formatteren
+    days = selection.take(selection.active())
+    codes = [code for code, _, _, _ in CSV_EXPORT_LINES]
+    amounts = np.stack([days.column(col) for _, col, _, _ in CSV_EXPORT_LINES], axis=1)
+
+    # Lang formaat: één rij per (dag, boeking) in dezelfde volgorde als voorheen
+    day_pos, line_pos = np.nonzero(amounts > 0)
+    if len(day_pos) == 0:
+        return pd.DataFrame([])
+    signs = np.array([sign for _, _, _, sign in CSV_EXPORT_LINES], dtype=np.int64)
+    bedrag = amounts[day_pos, line_pos] * signs[line_pos]
+
+    datum_fmt = pd.DatetimeIndex(days.datetimes()).strftime('%d-%m-%Y').to_numpy(dtype=object)
+    notitie = days.omschrijving
+    long = pd.DataFrame({
+        "Datum": datum_fmt[day_pos],
+        "Notitie": notitie[day_pos],
+        "Code": np.array(codes, dtype=object)[line_pos],
+        "Btw": np.array([btw for _, _, btw, _ in CSV_EXPORT_LINES], dtype=object)[line_pos],
+    })
+
+    info = [MAPPING.get(code, {}) for code in codes]
+    long["Rek"] = np.array([i.get('Rekening', '') for i in info], dtype=object)[line_pos]
+    long["Label"] = np.array([i.get('Label', '') for i in info], dtype=object)[line_pos]
+    fallback = np.array([i.get('Label', code) for i, code in zip(info, codes)], dtype=object)[line_pos]
+
+    desc = pd.Series("", index=long.index, dtype=object)
+    for k, code in enumerate(codes):
+        rows = line_pos == k
+        if not rows.any():
+            continue
+        template = info[k].get('Template', '')
+        template = template if isinstance(template, str) else ""
+        desc[rows] = render_template_column(template, long.loc[rows, "Datum"], long.loc[rows, "Notitie"])
+    long["Desc"] = desc.where(desc != "", pd.Series(fallback, index=long.index))
+    long["Bedrag"] = format_amounts(bedrag / 100)
+
+    veld_columns = {"Datum": "Datum", "Omschrijving": "Desc", "Label": "Label",
+                    "Bedrag": "Bedrag", "Grootboekrekening": "Rek", "BtwCode": "Btw"}
+    export_df = pd.DataFrame(index=long.index)
+    for _, cfg in export_config.iterrows():
+        if cfg['Bron'] == "Vast":
+            export_df[cfg['Kolom']] = cfg['Waarde']
+        elif cfg['Bron'] == "Veld" and cfg['Waarde'] in veld_columns:
+            export_df[cfg['Kolom']] = long[veld_columns[cfg['Waarde']]].to_numpy(dtype=object)
+        else:
+            export_df[cfg['Kolom']] = ""
+    return export_df
+
+# Uitgaande boekingen per statement, in deze volgorde
+STATEMENT_DEBITS = [('Geld_Bancontact', 'Bancontact'), ('Geld_Payconiq', 'Payconiq'),
+                    ('Geld_Overschrijving', 'Oversch'), ('Geld_Bonnen', 'Bonnen'),
+                    ('Geld_Afstorting', 'Afstorting')]
+PARALLEL_CHUNK_STATEMENTS = 250
+# Zonder pool: kleinere stukken, zodat voortgang en annuleren ongeveer per maand gebeuren
+PROGRESS_CHUNK_STATEMENTS = 31
+
+class ExportCancelled(Exception):
+    # Opgegooid door een progress-callback om een lopende export af te breken
+    pass
+
+def build_statement(row, coda_seq, opening_balance, MAPPING):
+    datum_iso = row['Datum']
+    transactions = []
+
+    if row['Totaal_Omzet'] > 0:
+        transactions.append({
+            "amt": row['Totaal_Omzet'], "sign": "CRDT",
+            "desc": f"Dagontvangsten {row['Omschrijving']}",
+            "dom": "PMNT", "fam": "RCDT", "sub": "ESCT"
+        })
+
+    for col, code_key in STATEMENT_DEBITS:
+        val = row[col]
+        if val > 0:
+            info = MAPPING.get(code_key, {})
+            desc_text = info.get('Template', '').replace("&datum&", datum_iso).replace("&notitie&", row['Omschrijving'])
+            if not desc_text:
+                desc_text = info.get('Label', code_key)
+            transactions.append({
+                "amt": val, "sign": "DBIT",
+                "desc": desc_text,
+                "dom": "PMNT", "fam": "ICDT", "sub": "ESCT"
+            })
+
+    daily_movement = sum(t["amt"] if t["sign"] == "CRDT" else -t["amt"] for t in transactions)
+    # Afronden op centen: geen drift over een lange keten van dagen
+    return {
+        "id": f"KASSA-{coda_seq:04d}",
+        "seq_nb": coda_seq,
+        "date": datum_iso,
+        "desc": row['Omschrijving'],
+        "opening_balance": opening_balance,
+        "closing_balance": round(opening_balance + daily_movement, 2),
+        "entries": transactions
+    }
+
+def iter_statements(rows, coda_seq, opening_balance, MAPPING):
+    current_balance_val = opening_balance
+    for row in rows:
+        if row['Totaal_Omzet'] == 0 and row['Totaal_Geld'] == 0:
+            continue
+        coda_seq += 1
+        stmt = build_statement(row, coda_seq, current_balance_val, MAPPING)
+        current_balance_val = stmt["closing_balance"]
+        yield stmt
+
+def plan_statements(selection, coda_seq, opening_balance):
+    # Volgnummer en beginsaldo van elk statement vooraf, zonder de dagen af te lopen.
+    # In centen opgeteld en dus exact; gelijk aan de (per dag afgeronde) keten in iter_statements.
+    kept = selection.take(selection.active())
+    omzet = kept.column('Totaal_Omzet')
+    movement = np.where(omzet > 0, omzet, 0)
+    for col, _ in STATEMENT_DEBITS:
+        val = kept.column(col)
+        movement = movement - np.where(val > 0, val, 0)
+    balances = saldo_index.to_cents(opening_balance) + np.cumsum(movement) - movement
+    seqs = np.arange(coda_seq + 1, coda_seq + 1 + len(kept))
+    return kept.rows(), seqs.tolist(), (balances / 100).tolist()
+
+def planned_statements(selection, coda_seq, opening_balance, MAPPING):
+    return [build_statement(row, seq, opening, MAPPING)
+            for row, seq, opening in zip(*plan_statements(selection, coda_seq, opening_balance))]
+
+def render_statement_chunk(rows, seqs, openings, MAPPING, context):
+    # Rendert enkel de <Stmt>-blokken; draait ook in een apart proces
+    template = templating.get_template(templating.CAMT053_TEMPLATE)
+    block = template.blocks["statement"]
+    parts = []
+    for row, seq, opening in zip(rows, seqs, openings):
+        stmt = build_statement(row, seq, opening, MAPPING)
+        parts.append("".join(block(template.new_context({**context, "stmt": stmt}))))
+    return "".join(parts)
+
+def render_chunked(selection, coda_seq, opening_balance, MAPPING, context, workers=1, executor="process",
+                   chunk_size=None, progress=None):
+    # workers > 1: stukken over een pool verdeeld; anders na elkaar in deze thread.
+    # progress(klaar, totaal) na elk stuk, in volgorde; mag ExportCancelled opgooien.
+    rows, seqs, openings = plan_statements(selection, coda_seq, opening_balance)
+    template = templating.get_template(templating.CAMT053_TEMPLATE)
+    # Kop en staart met het totale aantal statements; de blokken ertussen worden apart gerenderd
+    outer = template.new_context({**context, "statements": StatementStream(len(rows), [])})
+    head = "".join(template.blocks["kop"](outer))
+    tail = "".join(template.blocks["staart"](outer))
+    chunk_size = chunk_size or (PARALLEL_CHUNK_STATEMENTS if workers > 1 else PROGRESS_CHUNK_STATEMENTS)
+    bounds = range(0, len(rows), chunk_size)
+    chunks = ([rows[i:i + chunk_size] for i in bounds], [seqs[i:i + chunk_size] for i in bounds],
+              [openings[i:i + chunk_size] for i in bounds], itertools.repeat(MAPPING), itertools.repeat(context))
+    pool = None
+    if workers > 1:
+        pool_cls = concurrent.futures.ProcessPoolExecutor if executor == "process" else concurrent.futures.ThreadPoolExecutor
+        pool = pool_cls(max_workers=workers)
+        bodies = pool.map(render_statement_chunk, *chunks)
+    else:
+        bodies = map(render_statement_chunk, *chunks)
+    parts = [head]
+    try:
+        for i, body in zip(bounds, bodies):
+            parts.append(body)
+            if progress:
+                progress(min(i + chunk_size, len(rows)), len(rows))
+    finally:
+        if pool is not None:
+            # Bij annuleren de nog niet gestarte stukken laten vallen
+            pool.shutdown(cancel_futures=True)
+    parts.append(tail)
+    return "".join(parts)
+
+@instrumentation.timed()
+def generate_xml_export(start_date, end_date, kassa=None, workers=None, executor="process", progress=None):
+    # workers > 1: statements worden in stukken over een pool verdeeld (identieke uitvoer)
+    config = load_config(kassa)
+    selection = load_records(str(start_date), str(end_date), kassa)
+    if not len(selection):
+        return None, None
+
+    my_iban = config.get("iban", "").replace(" ", "")
+    MAPPING = get_yuki_mapping(kassa)
+    opening_balance = calculate_current_saldo(start_date, kassa)
+
+    # Ongewijzigde periode: hetzelfde bestand met dezelfde volgnummers, zonder coda_seq te verhogen
+    cache_dir = kassa_file(export_cache.CACHE_DIR, kassa)
+    cache_key = export_cache.make_key(
+        "xml", selection, my_iban, repr(opening_balance),
+        export_cache.file_version(kassa_file(SETTINGS_FILE, kassa)),
+        export_cache.file_version(os.path.join(templating.TEMPLATE_DIR, templating.CAMT053_TEMPLATE)))
+    hit = export_cache.get(cache_dir, cache_key)
+    if hit is not None:
+        return hit[0], hit[1]["naam"]
+
+    coda_seq = allocate_coda_seq(int(selection.active().sum()), kassa)
+
+    try:
+        context = {
+            "msg_id": f"KASSA-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            "creation_datetime": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+            "iban": my_iban,
+        }
+        xml_string = render_chunked(selection, coda_seq, opening_balance, MAPPING, context, workers or 1, executor,
+                                    progress=progress)
+        filename = f"CAMT053_{my_iban}_{datetime.now().strftime('%Y%m%d')}.xml"
+    except ExportCancelled:
+        # De gereserveerde volgnummers blijven verbruikt; ElctrncSeqNb moet enkel stijgen
+        raise
+    except Exception as e:
+        logger.error("Template fout: %s", e)
+        return None, None
+    export_cache.put(cache_dir, cache_key, xml_string,
+                     {"export": "xml", "naam": filename, "van": str(start_date), "tot": str(end_date),
+                      "eerste_volgnummer": coda_seq + 1})
+    return xml_string, filename
+
+# --- STREAMING CAMT.053 ---
+
+class StatementStream:
+    # Lengte is vooraf gekend (NbOfStmts), de statements zelf worden pas tijdens het renderen gebouwd
+    def __init__(self, count, statements):
+        self.count = count
+        self.statements = statements
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.statements)
+
+def month_windows(start_str, end_str):
+    current = pd.Timestamp(start_str)
+    end = pd.Timestamp(end_str)
+    while current <= end:
+        window_end = min(current + pd.offsets.MonthEnd(0), end)
+        yield current.strftime("%Y-%m-%d"), window_end.strftime("%Y-%m-%d")
+        current = window_end + pd.Timedelta(days=1)
+
+@contextmanager
+def range_reader(backend, start_str, end_str):
+    # Geïndexeerde backends lezen per maand via hun index; de CSV-backend parset per venster
+    # enkel de regels van die maanden uit de snapshot
+    if backend.indexed:
+        yield backend.load_range
+    else:
+        with backend.window_reader(start_str, end_str) as reader:
+            yield reader
+
+def iter_rows(reader, start_str, end_str):
+    for window_start, window_end in month_windows(start_str, end_str):
+        for _, row in reader(window_start, window_end).iterrows():
+            yield row
+
+def plan_xml_chunks(reader, start_str, end_str, split=None):
+    # Eerste, lichte pass: enkel tellen welke dagen een statement opleveren en in welk bestand
+    plan = []
+    total = 0
+    for window_start, window_end in month_windows(start_str, end_str):
+        df = reader(window_start, window_end)
+        dates = df.loc[~((df['Totaal_Omzet'] == 0) & (df['Totaal_Geld'] == 0)), 'Datum']
+        for datum in dates:
+            if split is None:
+                key = None
+            elif split == "month":
+                key = datum[:7]
+            else:
+                key = total // int(split)
+            if not plan or plan[-1]["key"] != key:
+                plan.append({"key": key, "count": 0})
+            plan[-1]["count"] += 1
+            total += 1
+    return plan, total
+
+@instrumentation.timed()
+def stream_xml_export(start_date, end_date, target_dir=".", split=None, kassa=None):
+    start_str, end_str = str(start_date), str(end_date)
+    config = load_config(kassa)
+    with range_reader(history_backend(kassa), start_str, end_str) as reader:
+        return _stream_xml_files(reader, start_str, end_str, target_dir, split, config, kassa)
+
+def _stream_xml_files(reader, start_str, end_str, target_dir, split, config, kassa):
+    plan, total = plan_xml_chunks(reader, start_str, end_str, split)
+    if total == 0:
+        return []
+
+    my_iban = config.get("iban", "").replace(" ", "")
+    MAPPING = get_yuki_mapping(kassa)
+
+    # Volgnummers worden vooraf gereserveerd; ElctrncSeqNb loopt door over alle bestanden
+    coda_seq = allocate_coda_seq(total, kassa)
+
+    statements = iter_statements(iter_rows(reader, start_str, end_str), coda_seq,
+                                 calculate_current_saldo(start_str, kassa), MAPPING)
+    now = datetime.now()
+    base_name = f"CAMT053_{my_iban}_{now.strftime('%Y%m%d')}"
+    files = []
+    try:
+        for i, chunk in enumerate(plan, start=1):
+            if split is None:
+                msg_id, filename = f"KASSA-{now.strftime('%Y%m%d%H%M%S')}", f"{base_name}.xml"
+            else:
+                label = chunk["key"] if split == "month" else f"{i:03d}"
+                msg_id, filename = f"KASSA-{now.strftime('%Y%m%d%H%M%S')}-{i:03d}", f"{base_name}_{label}.xml"
+            context = {
+                "msg_id": msg_id,
+                "creation_datetime": now.strftime("%Y-%m-%dT%H:%M:%S"),
+                "iban": my_iban,
+                "statements": StatementStream(chunk["count"], itertools.islice(statements, chunk["count"]))
+            }
+            path = os.path.join(target_dir, filename)
+            with open(path, "w", encoding="utf-8") as f:
+                for part in templating.generate(templating.CAMT053_TEMPLATE, context):
+                    f.write(part)
+            files.append(path)
+        return files
+    except Exception as e:
+        logger.error("Template fout: %s", e)
+        return None
+
+@instrumentation.timed()
+def write_csv_export(df, path):
+    # Puntkomma als scheidingsteken: de bedragen gebruiken een decimale komma
+    storage.write_atomic(path, lambda tmp: df.to_csv(tmp, index=False, sep=";"))
+
+# --- BANKAFSCHRIFT (HTML) ---
+
+def bankafschrift_rows(statements):
+    rows = []
+    for stmt in statements:
+        credit = sum(t["amt"] for t in stmt["entries"] if t["sign"] == "CRDT")
+        debit = sum(t["amt"] for t in stmt["entries"] if t["sign"] == "DBIT")
+        rows.append({
+            "date": datetime.strptime(stmt["date"], "%Y-%m-%d").strftime("%d-%m-%Y"),
+            "desc": stmt["desc"],
+            "credit": credit,
+            "debit": debit,
+            "balance": stmt["closing_balance"],
+        })
+    return rows
+
+def render_bankafschrift(statements, opening_balance, start_date, end_date, config):
+    rows = bankafschrift_rows(statements)
+    context = {
+        "company_name": config.get("bedrijfsnaam", ""),
+        "logo_path": config.get("logo_pad", ""),
+        "iban": config.get("iban", ""),
+        "period_start": pd.to_datetime(start_date).strftime("%d-%m-%Y"),
+        "period_end": pd.to_datetime(end_date).strftime("%d-%m-%Y"),
+        "generated_on": datetime.now().strftime("%d-%m-%Y %H:%M"),
+        "opening_balance": opening_balance,
+        "rows": rows,
+        "total_credit": sum(r["credit"] for r in rows),
+        "total_debit": sum(r["debit"] for r in rows),
+        "closing_balance": rows[-1]["balance"] if rows else opening_balance,
+    }
+    return templating.render(templating.BANKAFSCHRIFT_TEMPLATE, context)
+
+@instrumentation.timed()
+def generate_bankafschrift(start_date, end_date, kassa=None, progress=None):
+    # Zelfde statements als de CAMT.053-export, maar zonder volgnummers te reserveren
+    config = load_config(kassa)
+    selection = load_records(str(start_date), str(end_date), kassa)
+    opening_balance = calculate_current_saldo(start_date, kassa)
+    statements = planned_statements(selection, 0, opening_balance, get_yuki_mapping(kassa))
+    if progress:
+        progress(0, len(statements))
+    html = render_bankafschrift(statements, opening_balance, start_date, end_date, config)
+    filename = f"Bankafschrift_{config.get('iban', '').replace(' ', '')}_{start_date}_{end_date}.html"
+    return html, filename
@@ -0,0 +1,84 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+# --- DAGRECORDS ---
+# Compacte weergave van (een stuk) historiek voor de exports: datums als ordinaal (int32),
+# bedragen als centen (int64) in één aaneengesloten matrix met één rij per kolom, zodat elke
+# kolom een view zonder kopie is. Alle arrays zijn alleen-lezen; selecties maken nieuwe views
+# of (bij een masker) één compacte kopie. Geen floats meer in de lussen, dus geen afrondingsdrift.
+
+AMOUNT_COLUMNS = storage.AMOUNT_COLUMNS
+COLUMN_POS = {col: i for i, col in enumerate(AMOUNT_COLUMNS)}
+# date(1970, 1, 1).toordinal(): omrekening tussen ordinaal en numpy datetime64[D]
+_EPOCH_ORDINAL = 719163
+
+def to_cents_array(values):
+    euros = pd.to_numeric(pd.Series(values), errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    return np.rint(euros * 100).astype(np.int64)
+
+def _readonly(array):
+    array.flags.writeable = False
+    return array
+
+class DayRecords:
+    __slots__ = ("ordinals", "cents", "omschrijving")
+
+    def __init__(self, ordinals, cents, omschrijving):
+        self.ordinals = _readonly(ordinals)
+        self.cents = _readonly(cents)
+        self.omschrijving = _readonly(omschrijving)
+
+    @classmethod
+    def from_frame(cls, df):
+        n = len(df)
+        ordinals = (pd.to_datetime(df["Datum"]).to_numpy(dtype="datetime64[D]").astype(np.int64)
+                    + _EPOCH_ORDINAL).astype(np.int32) if n else np.empty(0, dtype=np.int32)
+        cents = np.empty((len(AMOUNT_COLUMNS), n), dtype=np.int64)
+        for i, col in enumerate(AMOUNT_COLUMNS):
+            cents[i] = to_cents_array(df[col]) if col in df else 0
+        return cls(ordinals, cents, df["Omschrijving"].to_numpy(dtype=object).copy())
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    @property
+    def nbytes(self):
+        # Voor de grensbewaking van de loadercache (cache._size)
+        return self.ordinals.nbytes + self.cents.nbytes + self.omschrijving.nbytes
+
+    def column(self, name):
+        return self.cents[COLUMN_POS[name]]
+
+    def datetimes(self):
+        return (self.ordinals.astype(np.int64) - _EPOCH_ORDINAL).astype("datetime64[D]")
+
+    def dates(self):
+        return np.datetime_as_string(self.datetimes(), unit="D").astype(object)
+
+    def take(self, selector):
+        # Slice: views op dezelfde buffers; masker of indices: één compacte kopie
+        if isinstance(selector, slice):
+            return DayRecords(self.ordinals[selector], self.cents[:, selector], self.omschrijving[selector])
+        return DayRecords(self.ordinals[selector], np.ascontiguousarray(self.cents[:, selector]),
+                          self.omschrijving[selector])
+
+    def active(self):
+        # Dagen die een boeking/statement opleveren: niet zowel omzet als geld nul
+        return (self.column("Totaal_Omzet") != 0) | (self.column("Totaal_Geld") != 0)
+
+    def rows(self):
+        # Dict per dag zoals build_statement ze verwacht; bedragen in euro
+        euros = (self.cents / 100).T.tolist()
+        return [{"Datum": datum, "Omschrijving": omschrijving, **dict(zip(AMOUNT_COLUMNS, values))}
+                for datum, omschrijving, values in zip(self.dates(), self.omschrijving, euros)]
+
+    def digest(self):
+        h = hashlib.sha256()
+        h.update(self.ordinals.tobytes())
+        h.update(self.cents.tobytes())
+        h.update(pd.util.hash_array(self.omschrijving.astype(str)).tobytes())
+        return h.hexdigest()
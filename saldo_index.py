@@ -0,0 +1,106 @@
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+import storage
+
+# --- SALDO-INDEX ---
+# Kasbeweging (Geld_Cash - Geld_Afstorting) per dag in centen plus het totaal per maand, in een
+# kleine SQLite-database naast de historiek. Een save wijzigt één dagrij en één maandrij, hoe
+# lang de historiek ook is. Beginsaldo = som van de maanden ervoor + de dagen ervoor in de maand.
+# De index onthoudt op welke toestand van de historiek (marker) hij gebaseerd is. Wijkt die af,
+# bv. na een crash tussen historiek en index, een teruggezette backup of een compactie, dan
+# wordt hij bij de volgende opvraging herbouwd.
+
+VERSION = 2
+
+def to_cents(value):
+    try:
+        return int(round(float(value) * 100))
+    except (TypeError, ValueError):
+        return 0
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (sleutel TEXT PRIMARY KEY, waarde TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS dagen (datum TEXT PRIMARY KEY, maand TEXT NOT NULL, "
+                 "net INTEGER NOT NULL) WITHOUT ROWID")
+    conn.execute("CREATE INDEX IF NOT EXISTS dagen_maand ON dagen (maand, datum)")
+    conn.execute("CREATE TABLE IF NOT EXISTS maanden (maand TEXT PRIMARY KEY, totaal INTEGER NOT NULL) WITHOUT ROWID")
+    return conn
+
+def _stamp(marker):
+    return f"{VERSION}:{marker or ''}"
+
+def _in_sync(conn, marker):
+    # Zonder marker (None) volstaat een opgebouwde index van deze versie
+    row = conn.execute("SELECT waarde FROM meta WHERE sleutel = 'historiek'").fetchone()
+    if row is None or not row[0].startswith(f"{VERSION}:"):
+        return False
+    return marker is None or row[0] == _stamp(marker)
+
+def _set_marker(conn, marker):
+    conn.execute("INSERT OR REPLACE INTO meta VALUES ('historiek', ?)", (_stamp(marker),))
+
+def _put_days(conn, datums, nets):
+    conn.executemany("INSERT OR REPLACE INTO dagen VALUES (?, ?, ?)",
+                     [(d, d[:7], n) for d, n in zip(datums, nets)])
+    conn.executemany("INSERT OR REPLACE INTO maanden SELECT maand, SUM(net) FROM dagen WHERE maand = ?",
+                     [(m,) for m in sorted({d[:7] for d in datums})])
+
+def rebuild(path, df_history, marker=None):
+    datums, nets = [], []
+    if df_history is not None and not df_history.empty:
+        cash = pd.to_numeric(df_history["Geld_Cash"], errors="coerce").fillna(0.0)
+        afst = pd.to_numeric(df_history["Geld_Afstorting"], errors="coerce").fillna(0.0)
+        net = (cash * 100).round().astype("int64") - (afst * 100).round().astype("int64")
+        days = pd.DataFrame({"Datum": df_history["Datum"].astype(str), "net": net})
+        days = days.drop_duplicates(subset="Datum", keep="first")
+        datums, nets = days["Datum"].tolist(), days["net"].tolist()
+    with storage.file_lock(path), closing(_connect(path)) as conn, conn:
+        conn.execute("DELETE FROM dagen")
+        conn.execute("DELETE FROM maanden")
+        _put_days(conn, datums, nets)
+        _set_marker(conn, marker)
+
+def _ensure(path, history_loader, marker):
+    if os.path.exists(path):
+        with closing(_connect(path)) as conn:
+            if _in_sync(conn, marker):
+                return
+    with storage.file_lock(path):
+        # Een save van een andere thread/proces kan net klaar zijn: opnieuw kijken onder de lock
+        if os.path.exists(path):
+            with closing(_connect(path)) as conn:
+                if _in_sync(conn, marker):
+                    return
+        rebuild(path, history_loader() if history_loader else None, marker)
+
+def update_days(path, datums, geld_cash, geld_afstorting, expected=None, marker=None):
+    # expected: marker van de historiek vóór deze schrijfactie, marker: erna. Liep de index
+    # al achter, dan blijft hij achter en wordt hij bij de volgende opvraging herbouwd.
+    nets = [to_cents(c) - to_cents(a) for c, a in zip(geld_cash, geld_afstorting)]
+    with storage.file_lock(path):
+        if not os.path.exists(path):
+            # Wordt bij de eerste opvraging volledig opgebouwd, inclusief deze dagen
+            return
+        with closing(_connect(path)) as conn, conn:
+            if not _in_sync(conn, expected):
+                return
+            _put_days(conn, list(datums), nets)
+            _set_marker(conn, marker)
+
+def update_day(path, datum_str, geld_cash, geld_afstorting, expected=None, marker=None):
+    update_days(path, [datum_str], [geld_cash], [geld_afstorting], expected, marker)
+
+def movement_before(path, datum_str, history_loader=None, marker=None):
+    _ensure(path, history_loader, marker)
+    month = datum_str[:7]
+    with closing(_connect(path)) as conn:
+        before = conn.execute("SELECT COALESCE(SUM(totaal), 0) FROM maanden WHERE maand < ?", (month,)).fetchone()[0]
+        within = conn.execute("SELECT COALESCE(SUM(net), 0) FROM dagen WHERE maand = ? AND datum < ?",
+                              (month, datum_str)).fetchone()[0]
+    return before + within
@@ -0,0 +1,477 @@
+import argparse
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from datetime import date
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: enkel vergrendeling binnen het proces
+    fcntl = None
+
+# --- OPSLAG DAGAFSLUITINGEN ---
+# Drie uitwisselbare backends voor de historiek:
+#   csv     - gesorteerde CSV-snapshot + append-only journaal (standaard)
+#   parquet - zelfde journaal, maar een getypeerde Parquet-snapshot met datumkolom (range-filters)
+#   sqlite  - ingebedde database met primaire sleutel op Datum
+# Het journaal bevat één JSON-regel per opgeslagen dag. Opslaan kost zo altijd één fsync'd
+# append; het journaal wordt periodiek (of op vraag) in de snapshot gecompacteerd.
+
+COLUMNS = ["Datum", "Omschrijving", "Totaal_Omzet", "Totaal_Geld", "Verschil",
+           "Omzet_0", "Omzet_6", "Omzet_12", "Omzet_21",
+           "Geld_Bancontact", "Geld_Cash", "Geld_Payconiq", "Geld_Overschrijving",
+           "Geld_Bonnen", "Geld_Afstorting", "Timestamp"]
+TEXT_COLUMNS = ["Datum", "Omschrijving", "Timestamp"]
+AMOUNT_COLUMNS = [c for c in COLUMNS if c not in TEXT_COLUMNS]
+
+JOURNAL_SUFFIX = ".journal"
+COMPACTING_SUFFIX = ".journal.compacting"
+COMPACT_THRESHOLD_BYTES = 256 * 1024
+# Hoeveel bytes snapshot window_reader per keer parset
+WINDOW_BYTES = 1024 * 1024
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+class _PathLock:
+    # Herintreedbare lock per bestand: threads via RLock, processen via flock op <pad>.lock
+    def __init__(self, path):
+        self.lock_path = path + ".lock"
+        self.rlock = threading.RLock()
+        self.depth = 0
+        self.fd = None
+
+    def acquire(self, blocking=True):
+        if not self.rlock.acquire(blocking=blocking):
+            return False
+        if self.depth == 0 and fcntl is not None:
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                os.close(fd)
+                self.rlock.release()
+                return False
+            self.fd = fd
+        self.depth += 1
+        return True
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0 and self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+        self.rlock.release()
+
+@contextmanager
+def file_lock(path, blocking=True):
+    key = os.path.abspath(path)
+    with _locks_guard:
+        if key not in _locks:
+            _locks[key] = _PathLock(key)
+        lock = _locks[key]
+    acquired = lock.acquire(blocking)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            lock.release()
+
+def write_atomic(path, write):
+    # Schrijft via een tijdelijk bestand + fsync + rename, zodat lezers nooit een half bestand zien
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    _fsync_dir(path)
+
+def _fsync_dir(path):
+    # Zorgt dat een rename/aanmaak zelf ook een crash overleeft (POSIX)
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _read_journal(path):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Half geschreven regel na een crash: overslaan
+                continue
+    return records
+
+def empty_frame():
+    return normalize(pd.DataFrame(columns=COLUMNS))
+
+def normalize(df):
+    # Vaste kolomvolgorde; bedragen blijven float, tekstvelden str (geen object-mix door fillna(""))
+    df = df.reindex(columns=COLUMNS + [c for c in df.columns if c not in COLUMNS])
+    for col in AMOUNT_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0).astype(float)
+    for col in TEXT_COLUMNS:
+        df[col] = df[col].fillna("").astype(str)
+    return df
+
+def _merge(snapshot, records):
+    if not records:
+        return snapshot
+    df_journal = pd.DataFrame(records)
+    if snapshot is None or snapshot.empty:
+        df = df_journal
+    else:
+        df = pd.concat([snapshot, df_journal], ignore_index=True)
+    df = df.drop_duplicates(subset="Datum", keep="last")
+    return df.sort_values(by="Datum", ascending=False, ignore_index=True)
+
+_RECORD_START = re.compile(rb"\d{4}-\d\d-\d\d[,\r\n]")
+
+def _month_blocks(f, first_month, last_month):
+    # Eén lichte pass over een CSV-snapshot met Datum als eerste kolom: per maand de byte-blokken
+    # van zijn regels (aaneengesloten in een gesorteerde snapshot). Een nieuwe rij begint enkel
+    # met een datum buiten een veld tussen aanhalingstekens: een omschrijving met een regeleinde
+    # (ook een regel die zelf met een datum begint) hoort bij de vorige rij. Een oneven aantal "
+    # op een regel opent of sluit zo'n veld; "" binnen een veld telt dubbel en verandert niets.
+    header = f.readline()
+    blocks = {}
+    month = None
+    quoted = False
+    offset = f.tell()
+    for line in f:
+        if not quoted and _RECORD_START.match(line):
+            month = line[:7].decode("ascii")
+        if line.count(b'"') % 2:
+            quoted = not quoted
+        if month is not None and first_month <= month <= last_month:
+            spans = blocks.setdefault(month, [])
+            if spans and spans[-1][1] == offset:
+                spans[-1][1] = offset + len(line)
+            else:
+                spans.append([offset, offset + len(line)])
+        offset += len(line)
+    return header, blocks
+
+def _in_range(df, start, end):
+    mask = (df["Datum"] >= start) & (df["Datum"] <= end)
+    return df.loc[mask].sort_values(by="Datum", ignore_index=True)
+
+class JournalBackend:
+    name = "csv"
+    suffix = ".csv"
+    indexed = False
+
+    def __init__(self, path):
+        self.path = path
+        self.journal = path + JOURNAL_SUFFIX
+        self.compacting = path + COMPACTING_SUFFIX
+
+    def files(self):
+        return [self.path, self.compacting, self.journal]
+
+    def _read_snapshot(self, start=None, end=None):
+        if not os.path.exists(self.path):
+            return None
+        return pd.read_csv(self.path, dtype={"Datum": str, "Omschrijving": str, "Timestamp": str})
+
+    def _write_snapshot(self, df, target):
+        with open(target, "w", encoding="utf-8", newline="") as f:
+            df.to_csv(f, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _read(self, start=None, end=None):
+        with file_lock(self.path):
+            snapshot = self._read_snapshot(start, end)
+            records = _read_journal(self.compacting) + _read_journal(self.journal)
+        if start is not None:
+            records = [r for r in records if start <= r.get("Datum", "") <= end]
+        df = _merge(snapshot, records)
+        return empty_frame() if df is None else normalize(df)
+
+    def load_all(self):
+        return self._read()
+
+    def load_range(self, start, end):
+        return _in_range(self._read(start, end), start, end)
+
+    def load_day(self, datum_str):
+        match = self.load_range(datum_str, datum_str)
+        return match.iloc[0] if not match.empty else None
+
+    def _snapshot_header(self, f):
+        header = f.readline()
+        f.seek(0)
+        return header.split(b",", 1)[0].strip() == b"Datum"
+
+    @contextmanager
+    def window_reader(self, start, end):
+        # Voor lange exports: geeft reader(s, e) die enkel de maanden rond dat venster parset, zodat
+        # het geheugen begrensd blijft tot ongeveer WINDOW_BYTES snapshot. Snapshot (open bestand, blijft geldig bij
+        # een compactie) en journaal worden één keer samen vastgelegd, zoals in _read.
+        with file_lock(self.path):
+            f = open(self.path, "rb") if os.path.exists(self.path) else None
+            records = [r for r in _read_journal(self.compacting) + _read_journal(self.journal)
+                       if start <= str(r.get("Datum", "")) <= end]
+        try:
+            if f is not None and not self._snapshot_header(f):
+                # Oudere snapshot met een andere kolomvolgorde: in één keer lezen
+                selection = _in_range(self._read(start, end), start, end)
+                yield lambda s, e: selection[(selection["Datum"] >= s) & (selection["Datum"] <= e)]
+                return
+            header, blocks = _month_blocks(f, start[:7], end[:7]) if f is not None else (b"", {})
+
+            # Ook maanden die (nog) enkel in het journaal staan
+            months = sorted(set(blocks) | {r["Datum"][:7] for r in records})
+            batch = {"months": set(), "df": None}
+
+            def parse(first):
+                # Vanaf de eerste gevraagde maand opeenvolgende maanden samen parsen tot
+                # WINDOW_BYTES: begrensd geheugen, zonder per maand de vaste kost van read_csv
+                chunks, size, taken = [], 0, []
+                for month in months[months.index(first):]:
+                    if taken and size >= WINDOW_BYTES:
+                        break
+                    for begin, stop in blocks.get(month, []):
+                        f.seek(begin)
+                        chunks.append(f.read(stop - begin))
+                        size += stop - begin
+                    taken.append(month)
+                snapshot = None
+                if chunks:
+                    snapshot = pd.read_csv(io.BytesIO(header + b"".join(chunks)),
+                                           dtype={"Datum": str, "Omschrijving": str, "Timestamp": str})
+                df = _merge(snapshot, [r for r in records if taken[0] <= r["Datum"][:7] <= taken[-1]])
+                batch.update(months=set(taken), df=empty_frame() if df is None else normalize(df))
+
+            def read(s, e):
+                wanted = [m for m in months if s[:7] <= m <= e[:7]]
+                if not wanted:
+                    return empty_frame()
+                if not batch["months"].issuperset(wanted):
+                    parse(wanted[0])
+                    if not batch["months"].issuperset(wanted):
+                        # Venster groter dan één batch: zoals load_range in één keer lezen
+                        return _in_range(self._read(s, e), s, e)
+                return _in_range(batch["df"], s, e)
+            yield read
+        finally:
+            if f is not None:
+                f.close()
+
+    def upsert(self, record):
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with file_lock(self.path):
+            is_new = not os.path.exists(self.journal)
+            with open(self.journal, "a+b") as f:
+                end = f.seek(0, os.SEEK_END)
+                if end > 0:
+                    f.seek(end - 1)
+                    if f.read(1) != b"\n":
+                        # Vorige schrijfactie werd onderbroken: afgebroken regel afsluiten
+                        f.write(b"\n")
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            if is_new:
+                _fsync_dir(self.journal)
+            size = os.path.getsize(self.journal)
+        if size >= COMPACT_THRESHOLD_BYTES:
+            self.compact_async()
+
+    def upsert_many(self, df):
+        # Bulk: alles in één snapshot-herschrijving i.p.v. één journaalregel per dag.
+        # Onder de compact-lock, zodat een lopende compactie de nieuwe snapshot niet overschrijft.
+        with file_lock(self.path + ".compact"), file_lock(self.path):
+            df = pd.concat([self._read(), normalize(df)], ignore_index=True)
+            self.replace_all(df.drop_duplicates(subset="Datum", keep="last"))
+
+    def replace_all(self, df):
+        df = normalize(df).sort_values(by="Datum", ascending=False)
+        with file_lock(self.path):
+            write_atomic(self.path, lambda tmp: self._write_snapshot(df, tmp))
+            for p in (self.compacting, self.journal):
+                if os.path.exists(p):
+                    os.remove(p)
+            _fsync_dir(self.path)
+
+    def compact(self, wait=True):
+        with file_lock(self.path + ".compact", blocking=wait) as acquired:
+            if not acquired:
+                return False
+            with file_lock(self.path):
+                # Een achtergebleven .compacting-bestand (crash) wordt eerst verwerkt
+                if not os.path.exists(self.compacting):
+                    if not os.path.exists(self.journal):
+                        return False
+                    os.replace(self.journal, self.compacting)
+                    _fsync_dir(self.path)
+
+            df = _merge(self._read_snapshot(), _read_journal(self.compacting))
+            df = empty_frame() if df is None else normalize(df)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            self._write_snapshot(df, tmp)
+
+            with file_lock(self.path):
+                os.replace(tmp, self.path)
+                _fsync_dir(self.path)
+                os.remove(self.compacting)
+                _fsync_dir(self.path)
+            return True
+
+    def compact_async(self):
+        thread = threading.Thread(target=self.compact, args=(False,), daemon=True)
+        thread.start()
+        return thread
+
+    def pending_bytes(self):
+        return sum(os.path.getsize(p) for p in (self.journal, self.compacting) if os.path.exists(p))
+
+class ParquetBackend(JournalBackend):
+    name = "parquet"
+    suffix = ".parquet"
+    indexed = True
+    ROW_GROUP_SIZE = 4096
+
+    def _read_snapshot(self, start=None, end=None):
+        if not os.path.exists(self.path):
+            return None
+        filters = None
+        if start is not None:
+            # Datum is een echte date32-kolom: row groups buiten de periode worden overgeslagen
+            filters = [("Datum", ">=", date.fromisoformat(start)), ("Datum", "<=", date.fromisoformat(end))]
+        df = pd.read_parquet(self.path, filters=filters)
+        df["Datum"] = df["Datum"].astype(str)
+        return df
+
+    def _write_snapshot(self, df, target):
+        df = df.copy()
+        df["Datum"] = pd.to_datetime(df["Datum"]).dt.date
+        with open(target, "wb") as f:
+            df.to_parquet(f, index=False, row_group_size=self.ROW_GROUP_SIZE)
+            f.flush()
+            os.fsync(f.fileno())
+
+class SqliteBackend:
+    name = "sqlite"
+    suffix = ".db"
+    indexed = True
+    TABLE = "dagafsluitingen"
+
+    def __init__(self, path):
+        self.path = path
+
+    def files(self):
+        return [self.path]
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=FULL")
+        cols = ", ".join(f"{c} REAL NOT NULL DEFAULT 0" for c in AMOUNT_COLUMNS)
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.TABLE} (Datum TEXT PRIMARY KEY, "
+                     f"Omschrijving TEXT, {cols}, Timestamp TEXT) WITHOUT ROWID")
+        return conn
+
+    def _query(self, where="", params=(), order="DESC"):
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(f"SELECT * FROM {self.TABLE} {where} ORDER BY Datum {order}", conn, params=params)
+        return normalize(df)
+
+    def load_all(self):
+        return self._query()
+
+    def load_range(self, start, end):
+        return self._query("WHERE Datum BETWEEN ? AND ?", (start, end), order="ASC")
+
+    def load_day(self, datum_str):
+        match = self._query("WHERE Datum = ?", (datum_str,))
+        return match.iloc[0] if not match.empty else None
+
+    def _rows(self, df):
+        df = normalize(df)[COLUMNS]
+        return list(df.itertuples(index=False, name=None))
+
+    def upsert(self, record):
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(f"INSERT OR REPLACE INTO {self.TABLE} ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                             self._rows(pd.DataFrame([record])))
+
+    def upsert_many(self, df):
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(f"INSERT OR REPLACE INTO {self.TABLE} ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                             self._rows(df))
+
+    def replace_all(self, df):
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"DELETE FROM {self.TABLE}")
+            conn.executemany(f"INSERT INTO {self.TABLE} ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                             self._rows(df))
+
+    def compact(self, wait=True):
+        return False
+
+    def compact_async(self):
+        return None
+
+    def pending_bytes(self):
+        return 0
+
+BACKENDS = {b.name: b for b in (JournalBackend, ParquetBackend, SqliteBackend)}
+
+def get_backend(name, data_file):
+    if name not in BACKENDS:
+        raise ValueError(f"Onbekende opslag-backend: {name}")
+    cls = BACKENDS[name]
+    return cls(os.path.splitext(data_file)[0] + cls.suffix)
+
+def migrate(data_file, source_name, target_name):
+    source = get_backend(source_name, data_file)
+    target = get_backend(target_name, data_file)
+    df = source.load_all()
+    target.replace_all(df)
+    return len(df)
+
+if __name__ == "__main__":
+    # Zoals de knop in Kassaldo Beheer: kopiëren en daarna de kassa naar de nieuwe opslag laten wijzen
+    import kassa_core
+
+    parser = argparse.ArgumentParser(description="Historiek migreren naar een andere opslag-backend")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("naar", choices=sorted(BACKENDS))
+    parser.add_argument("--kassa", help="Kassa (standaard: de hoofdkassa in de werkmap)")
+    parser.add_argument("--van", choices=sorted(BACKENDS), help="Bron-backend (standaard: de huidige uit de config)")
+    args = parser.parse_args()
+    try:
+        kassa_core.kassa_file(kassa_core.DATA_FILE, args.kassa)
+    except ValueError as e:
+        parser.error(str(e))
+    source = args.van or kassa_core.load_config(args.kassa).get("opslag", "csv")
+    if source == args.naar:
+        parser.exit(message=f"Kassa gebruikt al {args.naar}\n")
+    count, source = kassa_core.migrate_history(args.naar, args.kassa, source)
+    print(f"{count} dagen gemigreerd van {source} naar {args.naar}; de kassa gebruikt nu {args.naar}")
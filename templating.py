@@ -0,0 +1,39 @@
+import os
+import threading
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+# --- TEMPLATES ---
+# Eén gedeelde Jinja-omgeving per proces: gecompileerde templates blijven in het geheugen en
+# de bytecode wordt op schijf bewaard, zodat ook nieuwe processen (CLI-workers, een herstart
+# van Streamlit) niet opnieuw hoeven te compileren. auto_reload controleert enkel de mtime.
+# Autoescape voor HTML en XML: notities, bedrijfsnaam en logopad komen van gebruikers. De
+# bytecode hangt af van die instelling, vandaar een eigen patroon voor de cachebestanden.
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMT053_TEMPLATE = "camt053_template.xml"
+BANKAFSCHRIFT_TEMPLATE = "bankafschrift_template.html"
+BYTECODE_PATTERN = "__kassa_jinja2_escaped_%s.cache"
+
+_env = None
+_env_lock = threading.Lock()
+
+def get_environment():
+    global _env
+    if _env is None:
+        with _env_lock:
+            if _env is None:
+                _env = Environment(loader=FileSystemLoader(TEMPLATE_DIR),
+                                   bytecode_cache=FileSystemBytecodeCache(pattern=BYTECODE_PATTERN),
+                                   autoescape=select_autoescape(["html", "xml"]),
+                                   auto_reload=True)
+    return _env
+
+def get_template(name):
+    return get_environment().get_template(name)
+
+def render(name, context):
+    return get_template(name).render(context)
+
+def generate(name, context):
+    return get_template(name).generate(context)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import cache
+
+# De loadercache blijft begrensd: LRU op aantal en grootte, en een entry waarvan het bestand
+# gewijzigd is verdwijnt bij de volgende opvraging in plaats van te blijven staan.
+
+def test_lru_bound_on_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "MAX_ENTRIES", 3)
+    cache.invalidate()
+    path = tmp_path / "bron.txt"
+    path.write_text("x")
+    calls = []
+
+    @cache.file_cached(lambda key: [str(path)])
+    def load(key):
+        calls.append(key)
+        return key
+
+    for key in "abcd":
+        load(key)
+    assert cache.stats()["entries"] == 3
+    load("b")  # recent gebruikt: blijft
+    load("e")  # verdringt c
+    load("b")
+    load("c")
+    assert calls == ["a", "b", "c", "d", "e", "c"]
+    cache.invalidate()
+
+def test_bound_on_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "MAX_BYTES", 2500)
+    cache.invalidate()
+    path = tmp_path / "bron.txt"
+    path.write_text("x")
+
+    @cache.file_cached(lambda n: [str(path)], shared=True)
+    def load(n):
+        return np.zeros(n, dtype=np.int8)
+
+    load(1000)
+    load(1001)
+    load(1002)
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] == 2003
+    # Groter dan de grens: enkel de nieuwste blijft
+    load(5000)
+    assert cache.stats()["entries"] == 1
+    cache.invalidate()
+
+def test_stale_entry_dropped(tmp_path):
+    cache.invalidate()
+    path = tmp_path / "bron.txt"
+    path.write_text("x")
+
+    @cache.file_cached(lambda: [str(path)])
+    def load():
+        text = path.read_text()
+        if text != "x":
+            raise ValueError(text)
+        return text
+
+    assert load() == "x"
+    path.write_text("gewijzigd")
+    # De verouderde waarde wordt losgelaten, ook als het herladen mislukt
+    with pytest.raises(ValueError):
+        load()
+    assert cache.stats()["entries"] == 0
+    cache.invalidate()
@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import kassa_core
+import storage
+
+# Meerdere processen tegelijk: elk bewaart een dag (met een heel lage compactiedrempel, zodat
+# compacties tussen de saves door lopen) en reserveert CODA-volgnummers. Achteraf mag er geen
+# dag ontbreken, moeten de volgnummers aaneengesloten zijn en moet het saldo (via de index)
+# gelijk zijn aan de som over de historiek.
+
+N_WRITERS = 60
+N_PROCESSES = 6
+START_SALDO = 250.0
+
+def _init(workdir):
+    os.chdir(workdir)
+    storage.COMPACT_THRESHOLD_BYTES = 512
+
+def _amounts(i):
+    return round(100 + i * 1.37, 2), round((i % 7) * 12.5, 2)
+
+def _writer(i):
+    datum = date(2024, 1, 1) + timedelta(days=i)
+    cash, afstorting = _amounts(i)
+    df_input = pd.DataFrame([{"Label": "Omzet_21", "Bedrag": cash},
+                             {"Label": "Geld_Cash", "Bedrag": cash},
+                             {"Label": "Geld_Afstorting", "Bedrag": afstorting}])
+    kassa_core.save_transaction(datum, f"Schrijver {i}", df_input, cash, cash - afstorting, 0.0)
+    count = i % 3 + 1
+    start = kassa_core.allocate_coda_seq(count)
+    # Ook lezen terwijl anderen schrijven
+    kassa_core.calculate_current_saldo(datum)
+    return start, count
+
+def _migrator(targets):
+    for target in targets:
+        kassa_core.migrate_history(target)
+    return kassa_core.load_config()["opslag"]
+
+def test_saves_during_migration_are_not_lost(tmp_path, monkeypatch):
+    # Saves die lopen of wachten tijdens een migratie moeten in de nieuwe backend belanden
+    monkeypatch.chdir(tmp_path)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(N_PROCESSES, mp_context=ctx, initializer=_init, initargs=(str(tmp_path),)) as pool:
+        writers = [pool.submit(_writer, i) for i in range(N_WRITERS)]
+        migration = pool.submit(_migrator, ["sqlite", "csv", "sqlite"])
+        for future in writers:
+            future.result()
+        assert migration.result() == "sqlite"
+
+    history = kassa_core.history_backend().load_all()
+    assert kassa_core.history_backend().name == "sqlite"
+    assert sorted(history["Datum"]) == [str(date(2024, 1, 1) + timedelta(days=i)) for i in range(N_WRITERS)]
+
+def test_parallel_saves_and_coda_seq(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = kassa_core.load_config()
+    config["start_saldo"] = START_SALDO
+    kassa_core.save_config(config)
+    # Saldo-index al opgebouwd, zodat de saves hem incrementeel bijwerken
+    kassa_core.calculate_current_saldo("2024-01-01")
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(N_PROCESSES, mp_context=ctx, initializer=_init, initargs=(str(tmp_path),)) as pool:
+        blocks = list(pool.map(_writer, range(N_WRITERS)))
+
+    history = kassa_core.history_backend().load_all()
+    expected = [str(date(2024, 1, 1) + timedelta(days=i)) for i in range(N_WRITERS)]
+    assert sorted(history["Datum"]) == expected
+
+    blocks.sort()
+    assert [start for start, _ in blocks] == [sum(c for _, c in blocks[:k]) for k in range(len(blocks))]
+    assert kassa_core.load_config()["coda_seq"] == sum(c for _, c in blocks)
+
+    movement = (history["Geld_Cash"] - history["Geld_Afstorting"]).sum()
+    assert movement == pytest.approx(sum(c - a for c, a in map(_amounts, range(N_WRITERS))))
+    end = date(2024, 1, 1) + timedelta(days=N_WRITERS)
+    assert kassa_core.calculate_current_saldo(end) == pytest.approx(START_SALDO + movement)
+    middle = date(2024, 1, 1) + timedelta(days=N_WRITERS // 2)
+    before_middle = history[history["Datum"] < str(middle)]
+    assert kassa_core.calculate_current_saldo(middle) == pytest.approx(
+        START_SALDO + (before_middle["Geld_Cash"] - before_middle["Geld_Afstorting"]).sum())
+
+    totals = kassa_core.get_period_totals("maand")
+    assert totals["Geld_Cash"].sum() == pytest.approx(history["Geld_Cash"].sum())
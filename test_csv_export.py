@@ -0,0 +1,115 @@
+import pandas as pd
+import pytest
+
+import benchmark
+import cache
+import export_cache
+import kassa_core
+
+# De gevectoriseerde Yuki-export moet byte voor byte dezelfde CSV geven als de oorspronkelijke
+# implementatie met iterrows, hieronder bevroren zoals ze vóór de vectorisatie was.
+
+def old_generate_csv_export(start_date, end_date, kassa=None):
+    export_config = kassa_core.load_export_config(kassa)
+    MAPPING = kassa_core.get_yuki_mapping(kassa)
+    selection = kassa_core.history_backend(kassa).load_range(str(start_date), str(end_date))
+    if selection.empty:
+        return None
+
+    export_rows = []
+    for _, row in selection.iterrows():
+        if row['Totaal_Omzet'] == 0 and row['Totaal_Geld'] == 0:
+            continue
+        datum_fmt = pd.to_datetime(row['Datum']).strftime('%d-%m-%Y')
+        desc_user = row['Omschrijving']
+
+        transactions = []
+        def add_trx(code_key, bedrag, btw):
+            if bedrag <= 0:
+                return
+            info = MAPPING.get(code_key, {})
+            final_desc = info.get('Template', '').replace("&datum&", datum_fmt).replace("&notitie&", desc_user)
+            if not final_desc:
+                final_desc = info.get('Label', code_key)
+            transactions.append({"Rek": info.get('Rekening', ''), "Bedrag": -bedrag if code_key == "Afstorting" else bedrag, "Btw": btw, "Desc": final_desc, "Label": info.get('Label', '')})
+
+        for code, col, btw in [("Omzet_21", "Omzet_21", "V21"), ("Omzet_12", "Omzet_12", "V12"), ("Omzet_6", "Omzet_6", "V6"), ("Omzet_0", "Omzet_0", "V0")]:
+            if row[col] > 0:
+                add_trx(code, row[col], btw)
+        for code, col in [("Bancontact", "Geld_Bancontact"), ("Payconiq", "Geld_Payconiq"), ("Oversch", "Geld_Overschrijving"), ("Bonnen", "Geld_Bonnen"), ("Cash", "Geld_Cash")]:
+            if row[col] > 0:
+                add_trx(code, row[col], "")
+        if row['Geld_Afstorting'] > 0:
+            add_trx("Afstorting", row['Geld_Afstorting'], "")
+
+        for t in transactions:
+            export_row = {}
+            for _, cfg in export_config.iterrows():
+                col_name = cfg['Kolom']
+                source = cfg['Bron']
+                val_key = cfg['Waarde']
+                val = ""
+                if source == "Vast":
+                    val = val_key
+                elif source == "Veld":
+                    if val_key == "Datum":
+                        val = datum_fmt
+                    elif val_key == "Omschrijving":
+                        val = t['Desc']
+                    elif val_key == "Label":
+                        val = t['Label']
+                    elif val_key == "Bedrag":
+                        val = f"{t['Bedrag']:.2f}".replace('.', ',')
+                    elif val_key == "Grootboekrekening":
+                        val = t['Rek']
+                    elif val_key == "BtwCode":
+                        val = t['Btw']
+                export_row[col_name] = val
+            export_rows.append(export_row)
+    return pd.DataFrame(export_rows)
+
+NOTES = ["Markt &datum&", "Frituur & co", "&notitie& test", "R&D", "", "Gewone dag"]
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache.invalidate()
+    df = benchmark.write_history("csv", 800, 3)
+    df["Omschrijving"] = [NOTES[(i // 3) % len(NOTES)] if i % 3 else d for i, d in enumerate(df["Omschrijving"])]
+    kassa_core.history_backend().replace_all(df)
+
+    settings = pd.DataFrame(kassa_core.get_default_settings())
+    templates = {"Omzet_21": "&datum& / &notitie& / &datum&", "Omzet_6": "Vast zonder plaatshouders",
+                 "Bancontact": "&notitie&&datum&", "Afstorting": "Naar bank op &datum& (&notitie&)"}
+    settings["ExportDesc"] = [templates.get(code, desc) for code, desc in zip(settings["Code"], settings["ExportDesc"])]
+    kassa_core.save_settings(settings)
+
+    export_config = kassa_core.get_default_export_config()
+    export_config.loc[len(export_config)] = {"Kolom": "BTW", "Bron": "Veld", "Waarde": "BtwCode"}
+    export_config.loc[len(export_config)] = {"Kolom": "Onbekend", "Bron": "Veld", "Waarde": "Bestaat niet"}
+    kassa_core.save_export_config(export_config)
+    yield df
+    cache.invalidate()
+
+@pytest.mark.parametrize("start, end", [
+    ("2023-01-01", "2025-12-31"),   # volledige historiek
+    ("2024-02-10", "2024-03-20"),   # deelperiode
+    ("2025-12-31", "2025-12-31"),   # één dag
+    ("2010-01-01", "2023-10-05"),   # begint vóór de historiek
+    ("2030-01-01", "2030-12-31"),   # geen dagen
+])
+def test_csv_export_identical_to_iterrows_version(history, start, end):
+    export_cache.clear(export_cache.CACHE_DIR)
+    old = old_generate_csv_export(start, end)
+    new = kassa_core.generate_csv_export(start, end)
+    if old is None:
+        assert new is None
+        return
+    assert new.to_csv().encode() == old.to_csv().encode()
+    assert new.to_csv(sep=";", index=False).encode() == old.to_csv(sep=";", index=False).encode()
+
+def test_history_covers_edge_cases(history):
+    closed = history[(history["Totaal_Omzet"] == 0) & (history["Totaal_Geld"] == 0)]
+    assert len(closed) > 0
+    assert history["Omschrijving"].str.contains("&datum&", regex=False).any()
+    assert (history["Geld_Afstorting"] > 0).any()
@@ -0,0 +1,59 @@
+import os
+import re
+
+import pytest
+
+import benchmark
+import cache
+import export_cache
+import kassa_core
+import storage
+
+# De gestreamde CAMT.053-export (per maand gelezen, ook uit de CSV-snapshot) moet dezelfde
+# statements geven als generate_xml_export, ook met omschrijvingen over meerdere regels.
+# Volgnummers en aanmaaktijden verschillen per export en worden weggelaten.
+
+STMT = re.compile(r"<Stmt>.*?</Stmt>", re.S)
+VOLATILE = re.compile(r"KASSA-\d+|<ElctrncSeqNb>\d+</ElctrncSeqNb>|<CreDtTm>[^<]*</CreDtTm>")
+
+def statements(xml):
+    return [VOLATILE.sub("", stmt) for stmt in STMT.findall(xml)]
+
+@pytest.fixture(params=["csv", "sqlite"])
+def history(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # Kleine batches, zodat de snapshot in veel stukken gelezen wordt
+    monkeypatch.setattr(storage, "WINDOW_BYTES", 2000)
+    cache.invalidate()
+    df = benchmark.write_history(request.param, 120, 0)
+    later = df["Datum"].iloc[60]
+    notes = {10: "regel 1\nregel 2", 50: f"regel1\n{later},x", 51: 'met "aanhalingstekens"\nen, komma',
+             90: f'"\n{later},y\n"'}
+    for i, note in notes.items():
+        df.loc[df.index[i], "Omschrijving"] = note
+    kassa_core.history_backend().replace_all(df)
+    yield df
+    cache.invalidate()
+
+@pytest.mark.parametrize("split", [None, "month", 7])
+def test_streamed_statements_identical(history, tmp_path, split):
+    start, end = history["Datum"].min(), history["Datum"].max()
+    export_cache.clear(export_cache.CACHE_DIR)
+    xml, _ = kassa_core.generate_xml_export(start, end)
+    expected = statements(xml)
+    assert len(expected) > 100
+
+    target = tmp_path / f"out_{split}"
+    target.mkdir()
+    files = kassa_core.stream_xml_export(start, end, str(target), split=split)
+    streamed = []
+    for path in sorted(files):
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        found = statements(content)
+        assert f"<NbOfStmts>{len(found)}</NbOfStmts>" in content
+        streamed += found
+    assert streamed == expected
+    if split == 7:
+        assert len(files) == -(-len(expected) // 7)
+    assert all(os.path.dirname(p) == str(target) for p in files)